@@ -2,9 +2,11 @@ from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+import asyncio
+import html
 import os
 import re
-import requests
+import httpx
 import tempfile
 from PyPDF2 import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -37,6 +39,14 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 KANOON_API_TOKEN = os.getenv("KANOON_API_TOKEN")
 BASE_URL = "https://api.indiankanoon.org"
 FAISS_INDEX_PATH = "faiss_index"
+UPLOAD_CHUNK_SIZE = 1 << 20  # Stream uploads to disk in 1 MiB chunks
+CHUNK_SIZE = 1500               # Characters per chunk; smaller chunks retrieve more precisely
+CHUNK_OVERLAP = 200
+CONTEXT_CHARS_PER_CHUNK = 2000  # Context sent to Gemini per retrieved chunk
+CONTEXT_CHARS_TOTAL = 8000      # Context sent to Gemini per question
+
+# Shared HTTP client for Indian Kanoon (reuses TLS connections across requests)
+_HTTP: Optional[httpx.AsyncClient] = None
 
 # ---------------------- PYDANTIC MODELS ----------------------
 
@@ -69,39 +79,80 @@ class UploadResponse(BaseModel):
 
 # ---------------------- HELPER FUNCTIONS ----------------------
 
+_TAG_RE = re.compile(r'<[^>]+>')
+
 def strip_html_tags(text: str) -> str:
     """Remove HTML tags from text and decode HTML entities"""
     if not text:
         return ""
-    clean = re.sub(r'<[^>]+>', '', text)
-    clean = clean.replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
-    clean = clean.replace('&quot;', '"').replace('&#39;', "'").replace('&nbsp;', ' ')
-    return clean.strip()
-
-def _kanoon_headers():
+    # Most titles and headlines carry no markup at all
+    if "<" in text:
+        text = _TAG_RE.sub('', text)
+    if "&" not in text:
+        return text.strip()
+    # &nbsp; decodes to U+00A0; keep emitting plain spaces as before
+    return html.unescape(text).replace("\xa0", " ").strip()
+
+def _require_kanoon_token():
     if not KANOON_API_TOKEN:
         raise HTTPException(status_code=500, detail="KANOON_API_TOKEN missing")
-    return {
-        "Authorization": f"Token {KANOON_API_TOKEN}",
-        "Accept": "application/json"
-    }
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared keep-alive HTTP client used for Indian Kanoon requests"""
+    global _HTTP
+    if _HTTP is None:
+        _HTTP = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers={
+                "Authorization": f"Token {KANOON_API_TOKEN}",
+                "Accept": "application/json"
+            },
+            timeout=httpx.Timeout(10, connect=3)
+        )
+    return _HTTP
 
 def get_pdf_text(pdf_file) -> str:
-    text = ""
     pdf_reader = PdfReader(pdf_file)
-    for page in pdf_reader.pages:
-        text += page.extract_text() or ""
-    return text
+    return "".join([page.extract_text() or "" for page in pdf_reader.pages])
 
 def get_text_chunks(text: str) -> List[str]:
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     return text_splitter.split_text(text)
 
 def get_embeddings():
     return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 
-def format_docs(docs) -> str:
-    return "\n\n".join(doc.page_content for doc in docs)
+async def fetch_fragment(client: httpx.AsyncClient, doc_id, query: str) -> str:
+    """Fetch a cleaned document fragment for a search query, or "" on failure"""
+    try:
+        frag_r = await client.post(f"/docfragment/{doc_id}/", params={"formInput": query})
+        frag_r.raise_for_status()
+        frag_data = frag_r.json()
+        return strip_html_tags(frag_data.get("fragment", "") or frag_data.get("content", ""))
+    except Exception:
+        return ""
+
+def search_documents(question: str):
+    """Load the saved vector store and return the chunks most similar to a question"""
+    embeddings = get_embeddings()
+    vector_store = FAISS.load_local(FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
+    return vector_store.similarity_search(question)
+
+def build_vector_store(text_chunks: List[str]):
+    """Embed text chunks and save them as the vector store"""
+    vector_store = FAISS.from_texts(text_chunks, embedding=get_embeddings())
+    vector_store.save_local(FAISS_INDEX_PATH)
+
+def format_docs(docs, per_chunk: int = CONTEXT_CHARS_PER_CHUNK, total: int = CONTEXT_CHARS_TOTAL) -> str:
+    """Join retrieved chunks in rank order, capped per chunk and in total"""
+    parts, used = [], 0
+    for doc in docs:
+        piece = doc.page_content[:per_chunk]
+        if parts and used + len(piece) > total:
+            break
+        parts.append(piece)
+        used += len(piece)
+    return "\n\n".join(parts)
 
 def get_conversational_chain():
     prompt_template = """
@@ -139,30 +190,29 @@ async def health_check():
 async def upload_pdf(files: List[UploadFile] = File(...)):
     """Upload and process PDF files for chat"""
     try:
-        all_text = ""
+        all_parts: List[str] = []
         for file in files:
             if not file.filename.lower().endswith('.pdf'):
                 raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDF")
             
-            # Read PDF content
-            content = await file.read()
+            # Stream PDF content to disk without buffering it in memory
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(content)
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    tmp.write(chunk)
                 tmp_path = tmp.name
             
             try:
-                all_text += get_pdf_text(tmp_path)
+                all_parts.append(await asyncio.to_thread(get_pdf_text, tmp_path))
             finally:
                 os.unlink(tmp_path)
         
+        all_text = "".join(all_parts)
         if not all_text.strip():
             raise HTTPException(status_code=400, detail="Could not extract text from PDF(s)")
         
         # Create vector store
         text_chunks = get_text_chunks(all_text)
-        embeddings = get_embeddings()
-        vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
-        vector_store.save_local(FAISS_INDEX_PATH)
+        await asyncio.to_thread(build_vector_store, text_chunks)
         
         return UploadResponse(
             message="PDFs processed successfully",
@@ -182,13 +232,12 @@ async def chat_with_pdf(request: ChatRequest):
         if not os.path.exists(FAISS_INDEX_PATH):
             raise HTTPException(status_code=400, detail="No PDF has been uploaded yet. Please upload a PDF first.")
         
-        embeddings = get_embeddings()
-        vector_store = FAISS.load_local(FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-        docs = vector_store.similarity_search(request.question)
+        # Model loading and FAISS search are CPU-bound; keep them off the event loop
+        docs = await asyncio.to_thread(search_documents, request.question)
         
         chain = get_conversational_chain()
         context = format_docs(docs)
-        response = chain.invoke({"context": context, "question": request.question})
+        response = await chain.ainvoke({"context": context, "question": request.question})
         
         return ChatResponse(answer=response, success=True)
     except HTTPException:
@@ -202,33 +251,32 @@ async def chat_with_pdf(request: ChatRequest):
 async def search_kanoon(request: KanoonSearchRequest):
     """Search Indian Kanoon for legal cases"""
     try:
-        url = f"{BASE_URL}/search/?formInput={request.query}&pagenum={request.page}"
-        r = requests.post(url, headers=_kanoon_headers())
+        _require_kanoon_token()
+        client = get_http_client()
+        r = await client.post("/search/", params={"formInput": request.query, "pagenum": request.page})
         r.raise_for_status()
         data = r.json()
         
         docs = data.get("docs", [])
         cases = []
         
+        top_docs = []
         for doc in docs[:5]:  # Limit to top 5 results
-            title = strip_html_tags(doc.get("title", "Untitled Case"))
             doc_id = doc.get("docid") or doc.get("tid") or doc.get("id")
+            if doc_id:
+                top_docs.append((doc, doc_id, strip_html_tags(doc.get("headline", ""))))
+        
+        # Fetch missing snippets concurrently instead of one round-trip per case
+        fragments = iter(await asyncio.gather(*[
+            fetch_fragment(client, doc_id, request.query) for _, doc_id, headline in top_docs if not headline
+        ]))
+        
+        for doc, doc_id, snippet in top_docs:
+            title = strip_html_tags(doc.get("title", "Untitled Case"))
             
-            if not doc_id:
-                continue
-            
-            # Try to get headline/snippet
-            snippet = strip_html_tags(doc.get("headline", ""))
-            
+            # Fall back to the document fragment when there is no headline
             if not snippet:
-                try:
-                    frag_url = f"{BASE_URL}/docfragment/{doc_id}/?formInput={request.query}"
-                    frag_r = requests.post(frag_url, headers=_kanoon_headers())
-                    frag_r.raise_for_status()
-                    frag_data = frag_r.json()
-                    snippet = strip_html_tags(frag_data.get("fragment", "") or frag_data.get("content", ""))
-                except:
-                    snippet = ""
+                snippet = next(fragments)
             
             if not snippet:
                 snippet = "No relevant excerpt available."
@@ -249,12 +297,19 @@ async def search_kanoon(request: KanoonSearchRequest):
         )
     except HTTPException:
         raise
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Error connecting to Indian Kanoon: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the shared HTTP client"""
+    if _HTTP is not None:
+        await _HTTP.aclose()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
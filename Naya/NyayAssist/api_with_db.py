@@ -3,44 +3,98 @@ NyayAssist API with MySQL Database Integration
 Legal AI Assistant API for PDF Chat and Indian Kanoon Search
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Depends
+import os
+
+# One OpenMP/MKL thread per worker: concurrent requests otherwise each spawn a
+# full-size pool that oversubscribes the cores. Must be set before faiss/torch load.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("OMP_WAIT_POLICY", "PASSIVE")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
-import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from operator import attrgetter
+import asyncio
+import json
+import math
+import orjson
+import pickle
 import re
-import requests
+import shutil
+import httpx
 import tempfile
+import threading
 import time
 import hashlib
+import hmac
+import html
+import secrets
 import uuid
+import bcrypt
+
+try:
+    import fcntl  # POSIX advisory file locks, shared by all worker processes
+except ImportError:  # Windows: only the in-process lock applies (run a single worker)
+    fcntl = None
+import faiss
+import numpy as np
+from async_lru import alru_cache
+import torch
 from PyPDF2 import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from semantic_text_splitter import TextSplitter
+from tokenizers import Tokenizer
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.embeddings import Embeddings
 from dotenv import load_dotenv
 
 # Database imports
 from database import db_service, init_db
-from middleware import AccessLogMiddleware, get_client_ip
+from middleware import AccessLogMiddleware, SelectiveGZipMiddleware, get_client_ip
 
 # Law comparison imports
-from law_comparison import LawComparisonService
+from law_comparison import get_service as get_law_service
+
+# Semantic cache imports
+from semantic_cache import SemanticCache
+
+# ONNX Runtime embeddings backend (optional, needs optimum[onnxruntime])
+from onnx_embeddings import ONNXEmbeddings
+
+# Verification code store (Redis optional, needs redis)
+from otp_store import OTPStore
 
 load_dotenv()
 
 app = FastAPI(
     title="NyayAssist API",
     description="Legal AI Assistant API for PDF Chat and Indian Kanoon Search with MySQL Database",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add access logging middleware
 app.add_middleware(AccessLogMiddleware)
 
+# Compress JSON responses (legal text shrinks to a fraction); SSE streams must stay unbuffered
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    minimum_size=1024,
+    compresslevel=5,
+    exclude_paths=["/api/pdf/chat/stream"]
+)
+
 # CORS configuration for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -54,10 +108,73 @@ app.add_middleware(
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 KANOON_API_TOKEN = os.getenv("KANOON_API_TOKEN")
 BASE_URL = "https://api.indiankanoon.org"
+KANOON_CACHE_TTL = int(os.getenv("KANOON_CACHE_TTL", 3600))  # Seconds to reuse Kanoon responses
 FAISS_INDEX_PATH = "faiss_index"
+UPLOAD_CHUNK_SIZE = 1 << 20  # Stream uploads to disk in 1 MiB chunks
+# Spool uploads to RAM-backed tmpfs when available; extraction workers still read them by path
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+CHUNK_TOKENS = 256          # all-MiniLM-L6-v2 truncates inputs beyond 256 word pieces
+CHUNK_OVERLAP_TOKENS = 40   # ~15% overlap
+RETRIEVAL_K = 6             # Chunks retrieved as LLM context per question
+RETRIEVAL_FETCH_K = 20      # Nearest chunks considered for MMR re-ranking
+MMR_LAMBDA = 0.5            # 1 = pure relevance, 0 = pure diversity
+CONTEXT_TOKEN_BUDGET = 1500 # Max context tokens sent to the LLM per question
+STREAM_BUFFER_CHARS = 16_000  # Page text buffered before it is chunked during extraction
+EMBED_BATCH_SIZE = 256        # Chunks embedded per call when indexing uploads
+MIN_PAGES_PER_TASK = 8        # Fewer pages than this per worker task is not worth the IPC
+HNSW_M = 32                 # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 200  # Build-time search depth (higher = better recall, slower build)
+HNSW_EF_SEARCH = 64         # Query-time search depth
+# Vector storage for the HNSW index: 'fp32' or 'fp16' (half the bytes; fp16 needs no trained range,
+# unlike SQ8, whose range would be fit to whichever vectors the index happened to be built from)
+FAISS_VECTOR_DTYPE = os.getenv("FAISS_VECTOR_DTYPE", "fp16").lower()
+IVF_PQ_MIN_VECTORS = 10_000 # Switch to compressed IVF-PQ storage from this many chunks
+IVF_MIN_NLIST = 32          # Coarse clusters: ~8*sqrt(N), at least 39 training points each
+IVF_NPROBE = 16             # Clusters scanned per query
+PQ_M = 48                   # Sub-quantizers (8 dims each), 48 bytes per vector instead of 1536
+PQ_NBITS = 8
+MANIFEST_FILE = "manifest.json"  # Maps indexed file SHA-256 -> docstore chunk ids (content digests)
+WRITE_LOCK_FILE = ".write.lock"  # flock()ed by the worker currently updating the index
+CURRENT_FILE = "CURRENT"         # Names the published index version directory
+INDEX_VERSIONS_KEPT = 2          # Published versions kept (readers may still be opening the previous one)
+REBUILD_GROWTH_FACTOR = 1.5      # Rebuild the index once it grows 50% past its last build
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch").lower()  # 'torch' or 'onnx'
+EMBEDDINGS_INT8 = os.getenv("EMBEDDINGS_INT8", "false").lower() == "true"  # Dynamic INT8 on CPU (torch)
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", 1))       # Per worker; scale with uvicorn --workers
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", 1))
+FAISS_NUM_THREADS = int(os.getenv("FAISS_NUM_THREADS", 1))
+
+# Process-wide embeddings model and vector store (loaded once, reused per request)
+_EMBEDDINGS: Optional[Embeddings] = None
+_VECTOR_STORE: Optional[FAISS] = None
+_VECTOR_STORE_VERSION: Optional[str] = None
+_VECTOR_STORE_LOCK = threading.Lock()
+_TEXT_SPLITTER: Optional[TextSplitter] = None
+
+# Shared HTTP client for Indian Kanoon (keep-alive, HTTP/2 multiplexing)
+_HTTP: Optional[httpx.AsyncClient] = None
+
+# Worker processes for CPU-bound PDF text extraction
+_PROCESS_POOL: Optional[ProcessPoolExecutor] = None
 
 # Initialize law comparison service
-law_service = LawComparisonService()
+law_service = get_law_service()
+
+# Semantic cache for PDF chat answers (cosine similarity threshold is configurable)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+answer_cache = SemanticCache(dimension=EMBEDDING_DIMENSION, threshold=SEMANTIC_CACHE_THRESHOLD)
+
+# Deterministic generation keeps semantically cached answers consistent with fresh ones
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.0))
+
+# bcrypt work factor (each +1 doubles the cost of hashing a password)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# Email verification codes
+REDIS_URL = os.getenv("REDIS_URL")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", 600))
 
 # ---------------------- PYDANTIC MODELS ----------------------
 
@@ -143,40 +260,546 @@ class FeedbackRequest(BaseModel):
 
 # ---------------------- HELPER FUNCTIONS ----------------------
 
+_TAG_RE = re.compile(r'<[^>]+>')
+
 def strip_html_tags(text: str) -> str:
     """Remove HTML tags from text and decode HTML entities"""
     if not text:
         return ""
-    clean = re.sub(r'<[^>]+>', '', text)
-    clean = clean.replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
-    clean = clean.replace('&quot;', '"').replace('&#39;', "'").replace('&nbsp;', ' ')
-    return clean.strip()
-
-def _kanoon_headers():
+    # Most titles and headlines carry no markup at all
+    if "<" in text:
+        text = _TAG_RE.sub('', text)
+    if "&" not in text:
+        return text.strip()
+    # &nbsp; decodes to U+00A0; keep emitting plain spaces as before
+    return html.unescape(text).replace("\xa0", " ").strip()
+
+def _require_kanoon_token():
     if not KANOON_API_TOKEN:
         raise HTTPException(status_code=500, detail="KANOON_API_TOKEN missing")
-    return {
-        "Authorization": f"Token {KANOON_API_TOKEN}",
-        "Accept": "application/json"
-    }
 
-def get_pdf_text(pdf_file) -> str:
-    text = ""
-    pdf_reader = PdfReader(pdf_file)
-    for page in pdf_reader.pages:
-        text += page.extract_text() or ""
-    return text
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client used for Indian Kanoon requests (auth headers set once)"""
+    global _HTTP
+    if _HTTP is None:
+        _HTTP = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers={
+                "Authorization": f"Token {KANOON_API_TOKEN}",
+                "Accept": "application/json"
+            },
+            http2=True,
+            timeout=httpx.Timeout(10, connect=3),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    return _HTTP
+
+@alru_cache(maxsize=1024, ttl=KANOON_CACHE_TTL)
+async def _search(query: str, page: int) -> dict:
+    """Run an Indian Kanoon search (successful responses are cached)"""
+    _require_kanoon_token()
+    r = await get_http_client().post(
+        "/search/",
+        params={"formInput": query, "pagenum": page}
+    )
+    r.raise_for_status()
+    return orjson.loads(r.content)
+
+@alru_cache(maxsize=1024, ttl=KANOON_CACHE_TTL)
+async def _fragment(doc_id: str, query: str) -> dict:
+    """Fetch a document fragment for a query (successful responses are cached)"""
+    _require_kanoon_token()
+    r = await get_http_client().post(
+        f"/docfragment/{doc_id}/",
+        params={"formInput": query}
+    )
+    r.raise_for_status()
+    return orjson.loads(r.content)
+
+async def fetch_fragment(doc_id, query: str) -> str:
+    """Fetch a cleaned document fragment for a search query, or "" on failure"""
+    try:
+        frag_data = await _fragment(str(doc_id), query)
+        return strip_html_tags(frag_data.get("fragment", "") or frag_data.get("content", ""))
+    except Exception:
+        return ""
+
+async def spool_upload(file: UploadFile) -> Tuple[str, int, str]:
+    """Stream an upload to a temporary file, returning (path, size_bytes, sha256)"""
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=UPLOAD_SPOOL_DIR) as tmp:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            tmp.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+    return tmp.name, size, digest.hexdigest()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool used for PDF text extraction"""
+    global _PROCESS_POOL
+    if _PROCESS_POOL is None:
+        _PROCESS_POOL = ProcessPoolExecutor()
+    return _PROCESS_POOL
+
+@lru_cache(maxsize=1)
+def get_tokenizer() -> Tokenizer:
+    """Return the embedding model's tokenizer (used for chunking and context budgets)"""
+    return Tokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+
+def get_text_splitter() -> TextSplitter:
+    """Return the shared tokenizer-aware splitter, sized to the embedding model's capacity"""
+    global _TEXT_SPLITTER
+    if _TEXT_SPLITTER is None:
+        _TEXT_SPLITTER = TextSplitter.from_huggingface_tokenizer(
+            get_tokenizer(), capacity=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_TOKENS
+        )
+    return _TEXT_SPLITTER
+
+def iter_text_chunks(pages: Iterable[str]) -> Iterator[str]:
+    """Chunk text page by page, carrying the last (possibly partial) chunk into the next page"""
+    splitter = get_text_splitter()
+    buffer = ""
+    for page_text in pages:
+        buffer += page_text
+        if len(buffer) < STREAM_BUFFER_CHARS:
+            continue
+        chunks = splitter.chunks(buffer)
+        yield from chunks[:-1]
+        buffer = chunks[-1] if chunks else ""
+    if buffer.strip():
+        yield from splitter.chunks(buffer)
+
+def _extract_chunks(pdf_path: str, start: int, stop: int) -> Tuple[List[str], int]:
+    """
+    Extract text chunks from a page range of a PDF file (runs in a worker process)
+
+    Returns:
+        Tuple of (chunks, total_page_count); the range is clipped to the document
+    """
+    pdf_reader = PdfReader(pdf_path)
+    total = len(pdf_reader.pages)
+    pages = (pdf_reader.pages[i].extract_text() or "" for i in range(start, min(stop, total)))
+    return list(iter_text_chunks(pages)), total
+
+async def extract_pdf_chunks(pdf_path: str) -> Tuple[List[str], int]:
+    """
+    Extract text chunks from a PDF, spreading page ranges across worker processes
+
+    Args:
+        pdf_path: Path of the spooled PDF file
+
+    Returns:
+        Tuple of (chunks, page_count)
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    # The first range also reports the page count, so small PDFs are parsed only once
+    chunks, pages = await loop.run_in_executor(pool, _extract_chunks, pdf_path, 0, MIN_PAGES_PER_TASK)
+    if pages <= MIN_PAGES_PER_TASK:
+        return chunks, pages
+
+    # Spread the remaining pages over one range per core
+    remaining = pages - MIN_PAGES_PER_TASK
+    step = max(MIN_PAGES_PER_TASK, math.ceil(remaining / (os.cpu_count() or 1)))
+    ranges = await asyncio.gather(*[
+        loop.run_in_executor(pool, _extract_chunks, pdf_path, start, start + step)
+        for start in range(MIN_PAGES_PER_TASK, pages, step)
+    ])
+    return chunks + [chunk for range_chunks, _ in ranges for chunk in range_chunks], pages
+
+class InferenceModeEmbeddings(HuggingFaceEmbeddings):
+    """HuggingFaceEmbeddings that encode without autograd bookkeeping"""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with torch.inference_mode():
+            return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with torch.inference_mode():
+            return super().embed_query(text)
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """Embed documents into a float32 matrix, skipping the per-float list conversion"""
+        # Same preprocessing as HuggingFaceEmbeddings.embed_documents
+        texts = [text.replace("\n", " ") for text in texts]
+        with torch.inference_mode():
+            vectors = self._client.encode(texts, show_progress_bar=False, **self.encode_kwargs)
+        return np.asarray(vectors, dtype="float32")
+
+def configure_threads():
+    """Size PyTorch and FAISS thread pools explicitly (request-level parallelism comes from workers)"""
+    faiss.omp_set_num_threads(FAISS_NUM_THREADS)
+    torch.set_num_threads(TORCH_NUM_THREADS)
+    try:
+        torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+    except RuntimeError:
+        # Inter-op threads can only be set before any parallel work has started
+        pass
+
+def get_embeddings() -> Embeddings:
+    """Return the shared embeddings model, loading it on first use"""
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None and EMBEDDINGS_BACKEND == "onnx":
+        # Same per-worker thread budget as the torch backend (scale with --workers instead)
+        _EMBEDDINGS = ONNXEmbeddings(
+            EMBEDDING_MODEL_NAME,
+            intra_op_num_threads=TORCH_NUM_THREADS,
+            inter_op_num_threads=TORCH_INTEROP_THREADS
+        )
+    if _EMBEDDINGS is None:
+        use_cuda = torch.cuda.is_available()
+        if use_cuda:
+            # Half precision halves memory bandwidth for GPU inference
+            model_kwargs = {"device": "cuda", "model_kwargs": {"torch_dtype": torch.float16}}
+        else:
+            model_kwargs = {"device": "cpu"}
+        embeddings = InferenceModeEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME,
+            model_kwargs=model_kwargs,
+            encode_kwargs={"normalize_embeddings": True, "batch_size": 128, "convert_to_numpy": True}
+        )
+        if EMBEDDINGS_INT8 and not use_cuda:
+            # INT8 Linear layers use VNNI/AVX2 integer GEMM kernels on CPU
+            torch.quantization.quantize_dynamic(
+                embeddings._client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+        _EMBEDDINGS = embeddings
+    return _EMBEDDINGS
+
+def tune_index(index: faiss.Index):
+    """Apply query-time search parameters, which are not persisted with the index"""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = IVF_NPROBE
+        # MMR re-ranking reconstructs candidate vectors by id
+        if index.direct_map.no():
+            index.make_direct_map()
+
+def create_faiss_index(vectors: np.ndarray) -> faiss.Index:
+    """
+    Create an (empty) inner-product index suited to the corpus size
+
+    Small corpora use HNSW over float32 or float16 (FAISS_VECTOR_DTYPE) vectors;
+    large ones use IVF-PQ, trained on the given vectors, to cut index size and
+    scan bandwidth.
+    Inner product equals cosine similarity on normalized embeddings.
+    """
+    count, dimension = vectors.shape
+    if count < IVF_PQ_MIN_VECTORS:
+        if FAISS_VECTOR_DTYPE == "fp16":
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, HNSW_M,
+                                      faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)  # No-op for fp16 (no value range to fit), required before add
+        else:
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        nlist = max(IVF_MIN_NLIST, min(int(8 * math.sqrt(count)), count // 39))
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    tune_index(index)
+    return index
+
+def current_index_version() -> Optional[str]:
+    """
+    Return the published index version, or None if no index has been saved
+
+    Each save writes a new version directory and then atomically replaces the
+    CURRENT pointer, so a version's index, docstore and manifest always belong
+    together. "" denotes an index saved directly in FAISS_INDEX_PATH by older releases.
+    """
+    try:
+        with open(os.path.join(FAISS_INDEX_PATH, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "" if os.path.exists(os.path.join(FAISS_INDEX_PATH, "index.faiss")) else None
+
+def _index_dir(version: str) -> str:
+    return os.path.join(FAISS_INDEX_PATH, version) if version else FAISS_INDEX_PATH
+
+def vector_store_exists() -> bool:
+    """Check whether a saved vector store is available on disk"""
+    version = current_index_version()
+    if version is None:
+        return False
+    directory = _index_dir(version)
+    return (os.path.exists(os.path.join(directory, "index.faiss"))
+            and os.path.exists(os.path.join(directory, "index.pkl")))
+
+def load_vector_store(mmap: bool = True, version: Optional[str] = None) -> FAISS:
+    """
+    Load a saved vector store from disk
+
+    Args:
+        mmap: Memory-map the index read-only so large indexes page in on demand
+              (use False for a private, writable copy)
+        version: Index version to load (defaults to the published one)
+    """
+    if version is None:
+        version = current_index_version()
+        if version is None:
+            raise FileNotFoundError(f"No saved vector store in {FAISS_INDEX_PATH}")
+    directory = _index_dir(version)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(directory, "index.faiss"), flags)
+    tune_index(index)
+    with open(os.path.join(directory, "index.pkl"), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(
+        embedding_function=get_embeddings(),
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+    )
+
+def get_vector_store() -> FAISS:
+    """
+    Return the resident FAISS vector store, loading it from disk on first use
+
+    The store is reloaded only when a new version is published (e.g. after an
+    upload handled by another worker process).
+    """
+    global _VECTOR_STORE, _VECTOR_STORE_VERSION
+    version = current_index_version()
+    if _VECTOR_STORE is None or version != _VECTOR_STORE_VERSION:
+        _VECTOR_STORE = load_vector_store(version=version)
+        _VECTOR_STORE_VERSION = version
+    return _VECTOR_STORE
+
+def get_vector_store_version() -> Optional[str]:
+    """Return an identifier of the resident index state (reloading it if it changed)"""
+    get_vector_store()
+    return _VECTOR_STORE_VERSION
+
+def load_manifest() -> Dict:
+    """Load the published index manifest (indexed files and size at last full build)"""
+    version = current_index_version()
+    path = os.path.join(_index_dir(version), MANIFEST_FILE) if version is not None else None
+    if not vector_store_exists() or not os.path.exists(path):
+        return {"built_size": 0, "files": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def indexed_file_hashes() -> set:
+    """SHA-256 digests of the files already in the vector store"""
+    return set(load_manifest()["files"])
+
+def save_vector_store(vector_store: FAISS, manifest: Dict) -> str:
+    """
+    Persist the vector store and manifest as a new version and publish it
+
+    All files go into a fresh version directory; readers switch over only when
+    the CURRENT pointer is atomically replaced, so they never pair a new index
+    with an old docstore, and memory-mapped files are never modified in place.
+    Must be called with vector_store_write_lock() held.
+
+    Returns:
+        The published version name
+    """
+    os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    directory = os.path.join(FAISS_INDEX_PATH, version)
+    try:
+        vector_store.save_local(directory)
+        with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        pointer = os.path.join(FAISS_INDEX_PATH, CURRENT_FILE + ".tmp")
+        with open(pointer, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(FAISS_INDEX_PATH, CURRENT_FILE))
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    prune_index_versions()
+    return version
+
+def prune_index_versions():
+    """Delete all but the newest INDEX_VERSIONS_KEPT versions (and any pre-versioning files)"""
+    versions = sorted(
+        (name for name in os.listdir(FAISS_INDEX_PATH)
+         if name.startswith("v") and name[1:].isdigit()
+         and os.path.isdir(os.path.join(FAISS_INDEX_PATH, name))),
+        key=lambda name: int(name[1:])
+    )
+    # Processes that still map a deleted version keep reading it until they reload
+    for name in versions[:-INDEX_VERSIONS_KEPT]:
+        shutil.rmtree(os.path.join(FAISS_INDEX_PATH, name), ignore_errors=True)
+    if len(versions) >= INDEX_VERSIONS_KEPT:
+        # The flat layout of older releases predates every kept version
+        for name in ("index.faiss", "index.pkl", MANIFEST_FILE):
+            try:
+                os.remove(os.path.join(FAISS_INDEX_PATH, name))
+            except FileNotFoundError:
+                pass
+
+def rebuild_index(vector_store: FAISS):
+    """Re-create the FAISS index from its stored vectors (no re-embedding)"""
+    old_index = vector_store.index
+    if isinstance(old_index, faiss.IndexIVF):
+        old_index.make_direct_map()
+    vectors = old_index.reconstruct_n(0, old_index.ntotal)
+    index = create_faiss_index(vectors)
+    index.add(vectors)
+    vector_store.index = index
+
+@contextmanager
+def vector_store_write_lock():
+    """
+    Serialize index updates across threads and worker processes
+
+    Each upload is a read-modify-write of the manifest and index; without a
+    cross-process lock two workers would both start from the same saved state
+    and the last save would silently discard the other's chunks.
+    """
+    with _VECTOR_STORE_LOCK:
+        os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
+        with open(os.path.join(FAISS_INDEX_PATH, WRITE_LOCK_FILE), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def update_vector_store(file_chunks: Dict[str, List[str]]) -> Tuple[FAISS, int]:
+    """
+    Add chunks of newly uploaded files to the persisted vector store
+
+    Args:
+        file_chunks: Text chunks keyed by the SHA-256 of the file they came from
+
+    Returns:
+        Tuple of (vector_store, number_of_chunks_added)
+    """
+    global _VECTOR_STORE, _VECTOR_STORE_VERSION
+    with vector_store_write_lock():
+        # Read the saved state only once the lock is held: another worker may have
+        # indexed files (possibly these ones) while this upload was being extracted
+        manifest = load_manifest()
+        new_files = {h: chunks for h, chunks in file_chunks.items()
+                     if chunks and h not in manifest["files"]}
+        if not new_files:
+            return (get_vector_store() if vector_store_exists() else None), 0
+
+        # Modify a private in-memory copy; the resident (mmapped) store keeps serving chats
+        vector_store = load_vector_store(mmap=False) if vector_store_exists() else None
+
+        # Chunks are keyed by content digest; skip ones already indexed or repeated
+        # (e.g. boilerplate headers/footers)
+        seen = {chunk_id for chunk_ids in manifest["files"].values() for chunk_id in chunk_ids}
+        entries = []
+        for file_hash, chunks in new_files.items():
+            manifest["files"][file_hash] = []
+            for text in chunks:
+                digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+                if digest not in seen:
+                    seen.add(digest)
+                    entries.append((text, digest, file_hash))
+
+        if entries:
+            # Embed in minibatches straight into a float32 matrix instead of one
+            # Python float list per chunk (backends also length-sort within a batch)
+            embeddings = get_embeddings()
+            texts = [text for text, _, _ in entries]
+            ids = [chunk_id for _, chunk_id, _ in entries]
+            vectors = np.vstack([
+                embeddings.embed_documents_array(texts[start:start + EMBED_BATCH_SIZE])
+                for start in range(0, len(texts), EMBED_BATCH_SIZE)
+            ])
+
+            if vector_store is None:
+                vector_store = FAISS(
+                    embedding_function=embeddings,
+                    index=create_faiss_index(vectors),
+                    docstore=InMemoryDocstore(),
+                    index_to_docstore_id={},
+                    distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+                )
+            vector_store.add_embeddings(zip(texts, vectors), ids=ids)
+
+            for _, chunk_id, file_hash in entries:
+                manifest["files"][file_hash].append(chunk_id)
 
-def get_text_chunks(text: str) -> List[str]:
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
-    return text_splitter.split_text(text)
+        if vector_store.index.ntotal > manifest["built_size"] * REBUILD_GROWTH_FACTOR:
+            if manifest["built_size"]:
+                rebuild_index(vector_store)
+            manifest["built_size"] = vector_store.index.ntotal
 
-def get_embeddings():
-    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        _VECTOR_STORE_VERSION = save_vector_store(vector_store, manifest)
+        _VECTOR_STORE = vector_store
+        return vector_store, len(entries)
+
+_page_content = attrgetter("page_content")
 
 def format_docs(docs) -> str:
-    return "\n\n".join(doc.page_content for doc in docs)
+    return "\n\n".join(map(_page_content, docs))
+
+def budget_docs(docs, max_tokens: int = CONTEXT_TOKEN_BUDGET) -> Tuple[list, int]:
+    """Keep docs in rank order until the token budget is spent (the first doc is always kept)"""
+    if not docs:
+        return [], 0
+    lengths = [len(e.ids) for e in get_tokenizer().encode_batch(
+        list(map(_page_content, docs)), add_special_tokens=False
+    )]
+    kept, total = [], 0
+    for doc, n_tokens in zip(docs, lengths):
+        if kept and total + n_tokens > max_tokens:
+            break
+        kept.append(doc)
+        total += n_tokens
+    return kept, total
+
+def _search_context(question_vector: List[float]) -> Tuple[str, int]:
+    vector_store = get_vector_store()
+    # MMR drops near-duplicate chunks so the token budget is spent on distinct passages
+    docs = vector_store.max_marginal_relevance_search_by_vector(
+        question_vector, k=RETRIEVAL_K, fetch_k=RETRIEVAL_FETCH_K, lambda_mult=MMR_LAMBDA
+    )
+    docs, n_tokens = budget_docs(docs)
+    return format_docs(docs), n_tokens
 
+async def retrieve_context(question_vector: List[float]) -> Tuple[str, int]:
+    """
+    Retrieve diverse chunks for a question embedding within the context token budget
+
+    Returns:
+        Tuple of (formatted_context, context_tokens)
+    """
+    return await asyncio.to_thread(_search_context, question_vector)
+
+_LAW_COMPARISON_FIELDS = tuple(LawComparison.model_fields)
+
+def build_law_comparisons(comparisons: List[dict]) -> List[LawComparison]:
+    """Convert law service comparison dicts to response models (trusted data, no validation)"""
+    return [
+        LawComparison.model_construct(**{field: comp.get(field) for field in _LAW_COMPARISON_FIELDS})
+        for comp in comparisons
+    ]
+
+def get_law_comparison(law_type: str, section: str) -> Optional[LawComparison]:
+    """Return the shared comparison model for a section, or None if it is not mapped"""
+    comparison_data = law_service.get_comparison_data(law_type, section)
+    if not comparison_data:
+        return None
+    return _law_comparison_model(law_type.upper(), section.upper())
+
+# Only reached for mapped sections, so the cache is bounded by the (static) mapping size;
+# arbitrary user input never becomes a key
+@lru_cache(maxsize=None)
+def _law_comparison_model(law_type: str, section: str) -> LawComparison:
+    return build_law_comparisons([law_service.get_comparison_data(law_type, section)])[0]
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@lru_cache(maxsize=1)
 def get_conversational_chain():
     prompt_template = """
     Answer the question as detailed as possible from the provided context, make sure to provide all the details, if the answer is not in
@@ -191,27 +814,86 @@ def get_conversational_chain():
     """
     model = ChatGoogleGenerativeAI(
         model="gemini-2.5-flash",
-        temperature=0.3,
+        temperature=LLM_TEMPERATURE,
         google_api_key=GOOGLE_API_KEY
     )
     prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
     return prompt | model | StrOutputParser()
 
 def hash_password(password: str) -> str:
-    """Simple password hashing - use bcrypt in production"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash a password with bcrypt (salted and deliberately slow, so call it off the event loop)"""
+    return bcrypt.hashpw(password.encode()[:72], bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+
+def verify_password(password: str, stored_hash: str) -> Tuple[bool, bool]:
+    """
+    Check a password against a stored hash
+
+    Returns:
+        Tuple of (is_valid, needs_rehash); legacy unsalted SHA-256 hashes need a rehash
+    """
+    if stored_hash.startswith("$2"):
+        return bcrypt.checkpw(password.encode()[:72], stored_hash.encode()), False
+    legacy_hash = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy_hash, stored_hash), True
+
+def enqueue_log(table: str, **row) -> str:
+    """
+    Queue a row for the database's background log writer instead of inserting it in the request path
+
+    Args:
+        table: Target table (llm_outputs or feedback)
+        **row: Column values
+
+    Returns:
+        The row's UUID, generated here so it can be returned before the insert
+    """
+    uuid_column = "output_uuid" if table == "llm_outputs" else "feedback_uuid"
+    row.setdefault(uuid_column, str(uuid.uuid4()))
+    db_service.enqueue_log(table, row)
+    return row[uuid_column]
 
 # ---------------------- STARTUP EVENT ----------------------
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database and load the embeddings model and vector store on startup"""
     try:
         init_db()
         print("✅ Database initialized successfully")
     except Exception as e:
         print(f"⚠️ Database initialization warning: {e}")
 
+    try:
+        configure_threads()
+        get_embeddings()
+        get_text_splitter()
+        print("✅ Embeddings model loaded")
+    except Exception as e:
+        print(f"⚠️ Embeddings model load warning: {e}")
+
+    # Map the saved index now so the first chat does not pay for loading it
+    try:
+        if vector_store_exists():
+            vector_store = get_vector_store()
+            print(f"✅ Vector store loaded ({vector_store.index.ntotal} chunks)")
+    except Exception as e:
+        print(f"⚠️ Vector store load warning: {e}")
+
+    if not KANOON_API_TOKEN:
+        print("⚠️ KANOON_API_TOKEN not set, Indian Kanoon search is disabled")
+    get_http_client()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued logs, close the HTTP client and release worker processes on shutdown"""
+    await asyncio.to_thread(db_service.flush_logs)
+    if _HTTP is not None:
+        await _HTTP.aclose()
+    await otp_store.close()
+    if _PROCESS_POOL is not None:
+        _PROCESS_POOL.shutdown(wait=False, cancel_futures=True)
+
 # ---------------------- API ENDPOINTS ----------------------
 
 @app.get("/")
@@ -220,14 +902,25 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "database": "connected"}
+    return {
+        "status": "healthy",
+        "database": "connected",
+        "semantic_cache": {
+            "pdf_chat": answer_cache.stats()
+        },
+        "kanoon_search_cache": _search.cache_info()._asdict()
+    }
+
+@app.get("/health/db")
+async def health_db():
+    """Connection pool usage, to check the pool is sized for the worker/thread count"""
+    return db_service.pool_status()
 
 
 # ---------------------- USER ENDPOINTS ----------------------
 
-# In-memory storage for verification codes (for demo purposes)
-# In production, use Redis with expiration
-verification_codes = {}
+# Verification codes expire after OTP_TTL_SECONDS; set REDIS_URL to share them across workers
+otp_store = OTPStore(redis_url=REDIS_URL, ttl=OTP_TTL_SECONDS)
 
 # Email Imports
 import smtplib
@@ -293,26 +986,36 @@ def send_email_otp(to_email: str, otp: str):
         raise e
 
 
-@app.post("/api/users/send-otp")
-async def send_otp(request: SendOTPRequest):
-    """Send verification OTP to email"""
+def deliver_otp_email(to_email: str, otp: str, attempts: int = 3):
+    """Send an OTP email in the background, retrying transient SMTP failures with backoff"""
+    for attempt in range(1, attempts + 1):
+        try:
+            send_email_otp(to_email, otp)
+            return
+        except Exception as e:
+            if attempt == attempts:
+                print(f"❌ Giving up on OTP email to {to_email} after {attempts} attempts: {e}")
+                return
+            time.sleep(2 ** (attempt - 1))
+
+
+@app.post("/api/users/send-otp", status_code=202)
+async def send_otp(request: SendOTPRequest, background_tasks: BackgroundTasks):
+    """Send verification OTP to email (delivered after the response is returned)"""
     try:
         # Check if email already registered
-        existing = db_service.get_user_by_email(request.email)
+        existing = await asyncio.to_thread(db_service.get_user_by_email, request.email)
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Generate 6-digit OTP
-        otp = str(uuid.uuid4().int)[:6]
+        otp = f"{secrets.randbelow(1_000_000):06d}"
         
         # Store OTP
-        verification_codes[request.email] = otp
+        await otp_store.set(request.email, otp)
         
-        # Send Email
-        try:
-            send_email_otp(request.email, otp)
-        except Exception as e:
-             raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
+        # Send Email without holding the request open for the SMTP dialogue
+        background_tasks.add_task(deliver_otp_email, request.email, otp)
         
         return {"success": True, "message": "Verification code sent to email"}
     except HTTPException:
@@ -327,27 +1030,25 @@ class UserRegisterWithOTP(UserCreate):
 async def register_user(user: UserRegisterWithOTP):
     """Register a new user with OTP verification"""
     try:
-        # Verify OTP
-        stored_otp = verification_codes.get(user.email)
-        if not stored_otp or stored_otp != user.otp:
+        # Verify and consume the OTP in one step so a code cannot be replayed concurrently
+        if not await otp_store.consume(user.email, user.otp):
             raise HTTPException(status_code=400, detail="Invalid or expired verification code")
             
         # Check if user already exists
-        existing = db_service.get_user_by_email(user.email)
+        existing = await asyncio.to_thread(db_service.get_user_by_email, user.email)
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Create user (returns dict now)
-        new_user = db_service.create_user(
+        password_hash = await asyncio.to_thread(hash_password, user.password)
+        new_user = await asyncio.to_thread(
+            db_service.create_user,
             full_name=user.full_name,
             email=user.email,
-            password_hash=hash_password(user.password),
+            password_hash=password_hash,
             phone=user.phone
         )
         
-        # Clear used OTP
-        del verification_codes[user.email]
-        
         return UserResponse(
             user_uuid=new_user["user_uuid"],
             full_name=new_user["full_name"],
@@ -364,12 +1065,23 @@ async def register_user(user: UserRegisterWithOTP):
 async def login_user(credentials: UserLogin):
     """Login user"""
     try:
-        user = db_service.get_user_by_email(credentials.email)
-        if not user or user["password_hash"] != hash_password(credentials.password):
+        user = await asyncio.to_thread(db_service.get_user_by_email, credentials.email)
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid email or password")
+        
+        valid, needs_rehash = await asyncio.to_thread(
+            verify_password, credentials.password, user["password_hash"]
+        )
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
+        # Upgrade legacy SHA-256 hashes to bcrypt now that the plain password is known
+        if needs_rehash:
+            password_hash = await asyncio.to_thread(hash_password, credentials.password)
+            await asyncio.to_thread(db_service.update_password_hash, user["id"], password_hash)
+        
         # Update last login
-        db_service.update_last_login(user["id"])
+        await asyncio.to_thread(db_service.update_last_login, user["id"])
         
         return UserResponse(
             user_uuid=user["user_uuid"],
@@ -391,10 +1103,11 @@ async def create_session(session: SessionCreate):
     try:
         user_id = None
         if session.user_uuid:
-            user = db_service.get_user_by_uuid(session.user_uuid)
+            user = await asyncio.to_thread(db_service.get_user_by_uuid, session.user_uuid)
             user_id = user["id"] if user else None
         
-        new_session = db_service.create_chat_session(
+        new_session = await asyncio.to_thread(
+            db_service.create_chat_session,
             chat_mode=session.chat_mode,
             user_id=user_id,
             title=session.title
@@ -419,62 +1132,80 @@ async def upload_pdf(
 ):
     """Upload and process PDF files for chat"""
     try:
-        all_text = ""
-        total_pages = 0
         file_names = []
+        spooled = []
         
-        for file in files:
-            if not file.filename.lower().endswith('.pdf'):
-                raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDF")
-            
-            # Read PDF content
-            content = await file.read()
-            file_size = len(content)
-            file_names.append(file.filename)
+        try:
+            for file in files:
+                if not file.filename.lower().endswith('.pdf'):
+                    raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDF")
+                
+                # Stream PDF content to disk without buffering it in memory
+                spooled.append(await spool_upload(file))
+                file_names.append(file.filename)
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
+            # Files already indexed (same SHA-256) and processed before skip extraction
+            # and embedding; their earlier upload supplies the page and chunk counts
+            indexed = await asyncio.to_thread(indexed_file_hashes)
+            previous = {}
+            for _, _, file_hash in spooled:
+                if file_hash in indexed and file_hash not in previous:
+                    prior = await asyncio.to_thread(db_service.get_completed_pdf_upload, file_hash)
+                    if prior:
+                        previous[file_hash] = prior
             
-            try:
-                pdf_reader = PdfReader(tmp_path)
-                pages = len(pdf_reader.pages)
-                total_pages += pages
-                all_text += get_pdf_text(tmp_path)
-                
-                # Log PDF upload to database
-                upload = db_service.log_pdf_upload(
-                    original_filename=file.filename,
-                    file_size_bytes=file_size,
-                    file_content=content,
-                    pages_count=pages,
-                    processing_status="processing"
-                )
-            finally:
+            # Extract and chunk the remaining files in parallel worker processes (page by
+            # page, so the full text of a document is never held in memory)
+            pending = [tmp_path for tmp_path, _, file_hash in spooled if file_hash not in previous]
+            results = iter(await asyncio.gather(*[extract_pdf_chunks(tmp_path) for tmp_path in pending]))
+            extracted = [
+                ([], previous[file_hash]["pages_count"] or 0) if file_hash in previous else next(results)
+                for _, _, file_hash in spooled
+            ]
+        finally:
+            for tmp_path, _, _ in spooled:
                 os.unlink(tmp_path)
         
-        if not all_text.strip():
+        if not previous and not any(chunks for chunks, _ in extracted):
             raise HTTPException(status_code=400, detail="Could not extract text from PDF(s)")
         
-        # Create vector store
-        text_chunks = get_text_chunks(all_text)
-        embeddings = get_embeddings()
-        vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
-        vector_store.save_local(FAISS_INDEX_PATH)
-        
-        # Update PDF upload status
-        if upload:
-            db_service.update_pdf_processing_status(
-                upload_id=upload["id"],
-                status="completed",
-                chunks_processed=len(text_chunks)
+        total_pages = 0
+        upload = None
+        processed = []
+        chunks_processed = 0
+        for file_name, (_, file_size, file_hash), (chunks, pages) in zip(file_names, spooled, extracted):
+            total_pages += pages
+            prior = previous.get(file_hash)
+            
+            # Log PDF upload to database
+            upload = await asyncio.to_thread(
+                db_service.log_pdf_upload,
+                original_filename=file_name,
+                file_size_bytes=file_size,
+                file_hash=file_hash,
+                pages_count=pages,
+                chunks_processed=prior["chunks_processed"] if prior else 0,
+                processing_status="completed" if prior else "processing"
+            )
+            if prior:
+                chunks_processed += prior["chunks_processed"] or 0
+            else:
+                processed.append((upload, file_hash, chunks))
+        
+        # Embed only files that are not in the index yet
+        if processed:
+            await asyncio.to_thread(
+                update_vector_store, {file_hash: chunks for _, file_hash, chunks in processed}
             )
-            # Store text chunks
-            db_service.add_pdf_chunks(upload["id"], text_chunks)
+        # Store text chunks and mark every upload completed in one transaction
+        chunks_processed += sum(len(chunks) for _, _, chunks in processed)
+        await asyncio.to_thread(db_service.complete_pdf_uploads, {
+            file_upload["id"]: chunks for file_upload, _, chunks in processed if file_upload
+        })
         
         return UploadResponse(
             message=f"PDFs processed successfully: {', '.join(file_names)}",
-            chunks_processed=len(text_chunks),
+            chunks_processed=chunks_processed,
             success=True,
             upload_id=upload["upload_uuid"] if upload else None
         )
@@ -490,60 +1221,55 @@ async def chat_with_pdf(request: ChatRequest):
     start_time = time.time()
     
     try:
-        if not os.path.exists(FAISS_INDEX_PATH):
+        if not vector_store_exists():
             raise HTTPException(status_code=400, detail="No PDF has been uploaded yet. Please upload a PDF first.")
         
-        embeddings = get_embeddings()
-        vector_store = FAISS.load_local(FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-        docs = vector_store.similarity_search(request.question)
+        question_vector = await asyncio.to_thread(get_embeddings().embed_query, request.question)
+        # Cached answers are only valid for the index they were generated from
+        index_version = await asyncio.to_thread(get_vector_store_version)
         
-        chain = get_conversational_chain()
-        context = format_docs(docs)
-        response = chain.invoke({"context": context, "question": request.question})
+        # Reuse the answer of a semantically similar question if one is cached
+        context, context_tokens = None, None
+        response = answer_cache.lookup(question_vector, version=index_version)
+        if response is None:
+            context, context_tokens = await retrieve_context(question_vector)
+            chain = get_conversational_chain()
+            response = await chain.ainvoke({"context": context, "question": request.question})
+            answer_cache.add(question_vector, request.question, response, version=index_version)
         
         # Detect law sections and get comparisons
         augmented_response, comparisons = law_service.augment_answer(response, request.question)
         
         response_time_ms = int((time.time() - start_time) * 1000)
         
-        # Log LLM output to database
-        llm_log = db_service.log_llm_output(
+        # Log LLM output to database (written by the background log worker)
+        output_uuid = enqueue_log(
+            "llm_outputs",
             user_question=request.question,
             llm_response=augmented_response,  # Log the augmented response
-            context_provided=context[:5000] if context else None,  # Limit context size
+            context_provided=context,  # Bounded by CONTEXT_TOKEN_BUDGET
+            tokens_used=context_tokens,
             response_time_ms=response_time_ms,
             model_name="gemini-2.5-flash",
+            temperature=LLM_TEMPERATURE,
             success=True
         )
         
         # Convert comparisons to LawComparison objects
-        law_comparisons = None
-        if comparisons:
-            law_comparisons = [
-                LawComparison(
-                    old_law=comp['old_law'],
-                    old_section=comp['old_section'],
-                    old_title=comp['old_title'],
-                    new_law=comp['new_law'],
-                    new_section=comp['new_section'],
-                    new_title=comp['new_title'],
-                    changes=comp['changes'],
-                    original_text=comp.get('original_text')
-                )
-                for comp in comparisons
-            ]
+        law_comparisons = build_law_comparisons(comparisons) if comparisons else None
         
         return ChatResponse(
             answer=augmented_response,
             success=True,
-            message_id=llm_log["output_uuid"] if llm_log else None,
+            message_id=output_uuid,
             law_comparisons=law_comparisons
         )
     except HTTPException:
         raise
     except Exception as e:
         # Log error
-        db_service.log_llm_output(
+        enqueue_log(
+            "llm_outputs",
             user_question=request.question,
             llm_response="",
             success=False,
@@ -552,42 +1278,109 @@ async def chat_with_pdf(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/pdf/chat/stream")
+async def chat_with_pdf_stream(request: ChatRequest):
+    """
+    Ask questions about uploaded PDF documents, streaming the answer as Server-Sent Events
+
+    Emits `data: {"delta": "..."}` messages as tokens arrive, then an `event: done` message
+    carrying the detected law comparisons
+    """
+    if not vector_store_exists():
+        raise HTTPException(status_code=400, detail="No PDF has been uploaded yet. Please upload a PDF first.")
+    
+    start_time = time.time()
+    question_vector = await asyncio.to_thread(get_embeddings().embed_query, request.question)
+    index_version = await asyncio.to_thread(get_vector_store_version)
+    cached_answer = answer_cache.lookup(question_vector, version=index_version)
+    
+    async def event_stream():
+        context, context_tokens = None, None
+        try:
+            if cached_answer is not None:
+                # Cache hit: send the whole answer in one chunk
+                response = cached_answer
+                yield sse_event({"delta": response})
+            else:
+                context, context_tokens = await retrieve_context(question_vector)
+                chain = get_conversational_chain()
+                parts = []
+                async for token in chain.astream({"context": context, "question": request.question}):
+                    parts.append(token)
+                    yield sse_event({"delta": token})
+                response = "".join(parts)
+                answer_cache.add(question_vector, request.question, response, version=index_version)
+            
+            # Stream the law comparison appendix like the rest of the answer
+            augmented_response, comparisons = law_service.augment_answer(response, request.question)
+            if len(augmented_response) > len(response):
+                yield sse_event({"delta": augmented_response[len(response):]})
+            
+            enqueue_log(
+                "llm_outputs",
+                user_question=request.question,
+                llm_response=augmented_response,
+                context_provided=context,
+                tokens_used=context_tokens,
+                response_time_ms=int((time.time() - start_time) * 1000),
+                model_name="gemini-2.5-flash",
+                temperature=LLM_TEMPERATURE,
+                success=True
+            )
+            yield sse_event({
+                "success": True,
+                "law_comparisons": [c.model_dump() for c in build_law_comparisons(comparisons)]
+            }, event="done")
+        except Exception as e:
+            enqueue_log(
+                "llm_outputs",
+                user_question=request.question,
+                llm_response="",
+                success=False,
+                error_message=str(e)
+            )
+            yield sse_event({"success": False, "detail": str(e)}, event="error")
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 # ---------------------- KANOON ENDPOINTS ----------------------
 
 @app.post("/api/kanoon/search", response_model=KanoonSearchResponse)
-async def search_kanoon(request: KanoonSearchRequest):
+async def search_kanoon(request: KanoonSearchRequest, background_tasks: BackgroundTasks):
     """Search Indian Kanoon for legal cases"""
     start_time = time.time()
     
     try:
-        url = f"{BASE_URL}/search/?formInput={request.query}&pagenum={request.page}"
-        r = requests.post(url, headers=_kanoon_headers())
-        r.raise_for_status()
-        data = r.json()
+        # Collapse whitespace so trivially different spellings share cache entries
+        # (case is kept: Kanoon operators such as ANDD/ORR are upper-case). Responses are
+        # reused only for the exact normalized query and page: similar queries differing in a
+        # party name, section or doctypes:/fromdate: clause need different results
+        query = " ".join(request.query.split())
+        data = await _search(query, request.page)
         
         docs = data.get("docs", [])
         cases = []
         case_results_for_db = []
         
+        top_docs = []
         for doc in docs[:5]:  # Limit to top 5 results
-            title = strip_html_tags(doc.get("title", "Untitled Case"))
             doc_id = doc.get("docid") or doc.get("tid") or doc.get("id")
+            if doc_id:
+                top_docs.append((doc, doc_id, strip_html_tags(doc.get("headline", ""))))
+        
+        # Fetch missing snippets concurrently over the shared connection
+        fragments = await asyncio.gather(*[
+            fetch_fragment(doc_id, query) for _, doc_id, headline in top_docs if not headline
+        ])
+        fragments = iter(fragments)
+        
+        for doc, doc_id, snippet in top_docs:
+            title = strip_html_tags(doc.get("title", "Untitled Case"))
             
-            if not doc_id:
-                continue
-            
-            # Try to get headline/snippet
-            snippet = strip_html_tags(doc.get("headline", ""))
-            
+            # Fall back to the document fragment when there is no headline
             if not snippet:
-                try:
-                    frag_url = f"{BASE_URL}/docfragment/{doc_id}/?formInput={request.query}"
-                    frag_r = requests.post(frag_url, headers=_kanoon_headers())
-                    frag_r.raise_for_status()
-                    frag_data = frag_r.json()
-                    snippet = strip_html_tags(frag_data.get("fragment", "") or frag_data.get("content", ""))
-                except:
-                    snippet = ""
+                snippet = next(fragments)
             
             if not snippet:
                 snippet = "No relevant excerpt available."
@@ -620,22 +1413,13 @@ async def search_kanoon(request: KanoonSearchRequest):
         if detected_sections:
             comparisons = law_service.get_all_comparisons(detected_sections)
             if comparisons:
-                law_comparisons_list = [
-                    LawComparison(
-                        old_law=comp['old_law'],
-                        old_section=comp['old_section'],
-                        old_title=comp['old_title'],
-                        new_law=comp['new_law'],
-                        new_section=comp['new_section'],
-                        new_title=comp['new_title'],
-                        changes=comp['changes'],
-                        original_text=comp.get('original_text')
-                    )
-                    for comp in comparisons
-                ]
-        
-        # Log Kanoon query to database
-        kanoon_log = db_service.log_kanoon_query(
+                law_comparisons_list = build_law_comparisons(comparisons)
+        
+        # Log Kanoon query to database after the response is sent; the id is
+        # generated here so it can be returned without waiting for the insert
+        query_uuid = str(uuid.uuid4())
+        background_tasks.add_task(
+            db_service.log_kanoon_query,
             search_query=request.query,
             page_number=request.page,
             total_results_found=len(docs),
@@ -643,21 +1427,23 @@ async def search_kanoon(request: KanoonSearchRequest):
             response_time_ms=response_time_ms,
             success=True,
             raw_api_response=data,
-            case_results=case_results_for_db
+            case_results=case_results_for_db,
+            query_uuid=query_uuid
         )
         
         return KanoonSearchResponse(
             cases=cases,
             total_found=len(docs),
             success=True,
-            query_id=kanoon_log["query_uuid"] if kanoon_log else None,
+            query_id=query_uuid,
             law_comparisons=law_comparisons_list
         )
     except HTTPException:
         raise
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # Log error
-        db_service.log_kanoon_query(
+        await asyncio.to_thread(
+            db_service.log_kanoon_query,
             search_query=request.query,
             success=False,
             error_message=str(e)
@@ -675,17 +1461,18 @@ async def submit_feedback(feedback: FeedbackRequest):
     try:
         user_id = None
         if feedback.user_uuid:
-            user = db_service.get_user_by_uuid(feedback.user_uuid)
+            user = await asyncio.to_thread(db_service.get_user_by_uuid, feedback.user_uuid)
             user_id = user["id"] if user else None
         
-        fb = db_service.add_feedback(
+        feedback_uuid = enqueue_log(
+            "feedback",
             feedback_type=feedback.feedback_type,
             user_id=user_id,
             rating=feedback.rating,
             feedback_text=feedback.feedback_text
         )
         
-        return {"success": True, "feedback_id": fb["feedback_uuid"]}
+        return {"success": True, "feedback_id": feedback_uuid}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -723,25 +1510,14 @@ async def compare_law_section(request: LawCompareRequest):
             )
         
         # Get comparison data
-        comparison_data = law_service.get_comparison_data(law_type, request.section)
+        comparison = get_law_comparison(law_type, request.section.upper())
         
-        if not comparison_data:
+        if not comparison:
             return LawCompareResponse(
                 success=False,
                 error=f"No comparison data found for {law_type} Section {request.section}"
             )
         
-        # Convert to LawComparison object
-        comparison = LawComparison(
-            old_law=comparison_data['old_law'],
-            old_section=comparison_data['old_section'],
-            old_title=comparison_data['old_title'],
-            new_law=comparison_data['new_law'],
-            new_section=comparison_data['new_section'],
-            new_title=comparison_data['new_title'],
-            changes=comparison_data['changes']
-        )
-        
         return LawCompareResponse(
             success=True,
             comparison=comparison
@@ -793,18 +1569,10 @@ async def compare_law_sections_bulk(request: BulkCompareRequest):
                 })
                 continue
             
-            comparison_data = law_service.get_comparison_data(law_type, section_req.section)
+            comparison = get_law_comparison(law_type, section_req.section.upper())
             
-            if comparison_data:
-                comparisons.append(LawComparison(
-                    old_law=comparison_data['old_law'],
-                    old_section=comparison_data['old_section'],
-                    old_title=comparison_data['old_title'],
-                    new_law=comparison_data['new_law'],
-                    new_section=comparison_data['new_section'],
-                    new_title=comparison_data['new_title'],
-                    changes=comparison_data['changes']
-                ))
+            if comparison:
+                comparisons.append(comparison)
             else:
                 not_found.append({
                     "law_type": section_req.law_type,
@@ -834,34 +1602,8 @@ async def get_law_sections(law_type: str):
         if law_type not in ['IPC', 'CRPC', 'IEA']:
             raise HTTPException(status_code=400, detail="Invalid law_type. Must be IPC, CRPC, or IEA")
         
-        # Map law type to mapping key
-        mapping_key = {
-            'IPC': 'IPC_TO_BNS',
-            'CRPC': 'CRPC_TO_BNSS',
-            'IEA': 'IEA_TO_BEA'
-        }.get(law_type)
-        
-        sections_data = law_service.mapping_data.get(mapping_key, {})
-        
-        # Format sections with basic info
-        sections = []
-        for section_num, data in sections_data.items():
-            sections.append({
-                "section": section_num,
-                "title": data.get("old_title", ""),
-                "new_section": data.get("new_section", ""),
-                "new_law": {
-                    'IPC': 'BNS',
-                    'CRPC': 'BNSS',
-                    'IEA': 'BEA'
-                }.get(law_type, '')
-            })
-        
-        # Sort by section number
-        sections.sort(key=lambda x: (
-            int(''.join(filter(str.isdigit, x['section'])) or '0'),
-            x['section']
-        ))
+        # Sections are pre-sorted once when the service loads the mapping data
+        sections = law_service.get_sections(law_type)
         
         return {
             "success": True,
@@ -879,17 +1621,26 @@ async def get_law_sections(law_type: str):
 # ---------------------- ANALYTICS ENDPOINTS ----------------------
 
 @app.get("/api/analytics/stats")
-async def get_stats():
-    """Get usage statistics"""
+async def get_stats(request: Request):
+    """Get usage statistics (cacheable for a minute, revalidated by ETag)"""
     try:
-        daily_stats = db_service.get_daily_stats(days=30)
-        popular_searches = db_service.get_popular_searches(limit=10)
+        daily_stats = await asyncio.to_thread(db_service.get_daily_stats, days=30)
+        popular_searches = await asyncio.to_thread(db_service.get_popular_searches, limit=10)
         
-        return {
+        response = ORJSONResponse({
             "success": True,
             "daily_stats": daily_stats,
             "popular_searches": popular_searches
-        }
+        })
+        etag = f'"{hashlib.blake2b(response.body, digest_size=16).hexdigest()}"'
+        cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+        
+        # Unchanged stats: let the browser reuse its copy
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=cache_headers)
+        
+        response.headers.update(cache_headers)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
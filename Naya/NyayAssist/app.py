@@ -5,6 +5,7 @@ import os
 import re
 import requests
 import faiss
+import torch
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -20,6 +21,12 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 KANOON_API_TOKEN = os.getenv("KANOON_API_TOKEN")
 BASE_URL = "https://api.indiankanoon.org"
 
+# ---------------------- PDF CHAT CONFIG ----------------------
+CHUNK_SIZE = 1500               # Characters per chunk; smaller chunks retrieve more precisely
+CHUNK_OVERLAP = 200
+CONTEXT_CHARS_PER_CHUNK = 2000  # Context sent to Gemini per retrieved chunk
+CONTEXT_CHARS_TOTAL = 8000      # Context sent to Gemini per question
+
 
 def strip_html_tags(text):
     """Remove HTML tags from text and decode HTML entities"""
@@ -58,29 +65,45 @@ def fetch_fragment(doc_id, query):
 
 
 def get_pdf_text(pdf_docs):
-    text=""
+    parts = []
     for pdf in pdf_docs:
-        pdf_reader= PdfReader(pdf)
-        for page in pdf_reader.pages:
-            text+= page.extract_text()
-    return  text
+        pdf_reader = PdfReader(pdf)
+        parts.extend(page.extract_text() or "" for page in pdf_reader.pages)
+    return "".join(parts)
 
 
 
 def get_text_chunks(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     chunks = text_splitter.split_text(text)
     return chunks
 
 
+@st.cache_resource
+def get_embeddings():
+    """Load the embeddings model once per Streamlit process and reuse it across reruns"""
+    return HuggingFaceEmbeddings(
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": 128}
+    )
+
+
 def get_vector_store(text_chunks):
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
+    vector_store = FAISS.from_texts(text_chunks, embedding=get_embeddings())
     vector_store.save_local("faiss_index")
 
 
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+def format_docs(docs, per_chunk=CONTEXT_CHARS_PER_CHUNK, total=CONTEXT_CHARS_TOTAL):
+    """Join retrieved chunks in rank order, capped per chunk and in total"""
+    parts, used = [], 0
+    for doc in docs:
+        piece = doc.page_content[:per_chunk]
+        if parts and used + len(piece) > total:
+            break
+        parts.append(piece)
+        used += len(piece)
+    return "\n\n".join(parts)
 
 
 def get_conversational_chain():
@@ -111,9 +134,7 @@ def get_conversational_chain():
 
 
 def user_input(user_question):
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    
-    new_db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
+    new_db = FAISS.load_local("faiss_index", get_embeddings(), allow_dangerous_deserialization=True)
     docs = new_db.similarity_search(user_question)
 
     chain = get_conversational_chain()
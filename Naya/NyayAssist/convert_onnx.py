@@ -0,0 +1,46 @@
+"""
+NyayAssist ONNX Export Script
+Run this script once to export the embeddings model to ONNX (FP32 + dynamic INT8)
+so the API can serve embeddings with EMBEDDINGS_BACKEND=onnx
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from onnx_embeddings import DEFAULT_EXPORT_DIR, export_onnx_model
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def convert(export_dir: str, quantize: bool) -> bool:
+    """Export (and optionally quantize) the model"""
+    print("\n" + "="*60)
+    print("NyayAssist ONNX Export")
+    print("="*60 + "\n")
+    
+    try:
+        model_path = export_onnx_model(MODEL_NAME, export_dir, quantize)
+        print(f"✅ ONNX model ready at {model_path}")
+        return True
+    except ImportError as e:
+        print(f"❌ Missing dependency: {e}")
+        print("Install it with: pip install \"optimum[onnxruntime]\"")
+        return False
+    except Exception as e:
+        print(f"❌ Error exporting model: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="NyayAssist ONNX Export")
+    parser.add_argument("--output", default=str(DEFAULT_EXPORT_DIR), help="Export directory")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip INT8 quantization")
+    args = parser.parse_args()
+    
+    success = convert(args.output, quantize=not args.no_quantize)
+    sys.exit(0 if success else 1)
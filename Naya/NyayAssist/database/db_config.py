@@ -19,7 +19,14 @@ DB_CONFIG = {
     "charset": "utf8mb4",
     "collation": "utf8mb4_unicode_ci",
     "autocommit": True,
-    "pool_size": 5,
+    "pool_size": int(os.getenv("DB_POOL_SIZE", 20)),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 40)),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),  # Seconds, below MySQL wait_timeout
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),  # Seconds to wait for a free connection
+    "user_cache_size": int(os.getenv("USER_CACHE_SIZE", 10_000)),
+    "user_cache_ttl": int(os.getenv("USER_CACHE_TTL", 60)),  # Seconds a user lookup is reused
+    "analytics_cache_ttl": int(os.getenv("ANALYTICS_CACHE_TTL", 300)),  # Seconds analytics queries are reused
+    "log_queue_size": int(os.getenv("LOG_QUEUE_SIZE", 10_000)),  # Pending log rows before new ones are dropped
     "pool_name": "nyayassist_pool"
 }
 
@@ -3,36 +3,96 @@ NyayAssist Database Service
 Provides database operations for logging and retrieving data
 """
 
+import atexit
+import logging
+import queue
 import uuid
 import hashlib
+import threading
 import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine, text
+import orjson
+from cachetools import TTLCache, cached
+from cachetools.keys import methodkey
+from sqlalchemy import bindparam, case, create_engine, insert, select, update
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
 
-from .db_config import get_database_url
+from .db_config import DB_CONFIG, get_database_url
 from .models import (
     User, UserSession, AccessLog, ChatSession, Message,
     LLMOutput, KanoonQuery, KanoonCaseResult, PDFUpload,
     PDFTextChunk, APIRateLimit, Analytics, Feedback
 )
 
+logger = logging.getLogger(__name__)
+
+
+def _json_dumps(value: Any) -> str:
+    # PyMySQL binds str parameters, so decode orjson's bytes once here
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+# Analytics aggregate over slowly changing tables, so results are shared for a few minutes
+_DAILY_STATS_CACHE = TTLCache(maxsize=64, ttl=DB_CONFIG["analytics_cache_ttl"])
+_POPULAR_SEARCHES_CACHE = TTLCache(maxsize=64, ttl=DB_CONFIG["analytics_cache_ttl"])
+_ANALYTICS_CACHE_LOCK = threading.Lock()
+
+# Write-only UPDATEs built once; synchronize_session=False skips the identity-map pass
+_UPDATE_LAST_LOGIN = update(User).where(User.id == bindparam("uid"))\
+    .values(last_login_at=bindparam("ts")).execution_options(synchronize_session=False)
+_UPDATE_PASSWORD_HASH = update(User).where(User.id == bindparam("uid"))\
+    .values(password_hash=bindparam("new_hash")).execution_options(synchronize_session=False)
+_UPDATE_SESSION_TITLE = update(ChatSession).where(ChatSession.id == bindparam("sid"))\
+    .values(title=bindparam("new_title")).execution_options(synchronize_session=False)
+
 
 class DatabaseService:
     """Main database service class for NyayAssist"""
     
     def __init__(self):
+        # Sized for the threads that run blocking DB calls off the event loop
         self.engine = create_engine(
             get_database_url(),
-            pool_size=5,
-            max_overflow=10,
-            pool_pre_ping=True
+            pool_size=DB_CONFIG["pool_size"],
+            max_overflow=DB_CONFIG["max_overflow"],
+            pool_recycle=DB_CONFIG["pool_recycle"],
+            pool_timeout=DB_CONFIG["pool_timeout"],
+            pool_pre_ping=True,
+            # Rows per multi-VALUES statement when a bulk insert needs generated keys back
+            insertmanyvalues_page_size=1000,
+            # JSON columns (request_body, raw_api_response) encode/decode with orjson
+            json_serializer=_json_dumps,
+            json_deserializer=orjson.loads
         )
-        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+        # Objects returned by get_* methods stay readable after their session commits
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False,
+                                         expire_on_commit=False)
+        # User rows change rarely; lookups by email/UUID are reused for a short TTL
+        self._user_cache = TTLCache(maxsize=DB_CONFIG["user_cache_size"], ttl=DB_CONFIG["user_cache_ttl"])
+        self._user_cache_lock = threading.Lock()
+        # Log rows are inserted in batches by a daemon thread, off the request path
+        self._log_queue = queue.Queue(maxsize=DB_CONFIG["log_queue_size"])
+        self._log_thread = threading.Thread(target=self._drain_logs, name="db-log-writer", daemon=True)
+        self._log_thread.start()
+        atexit.register(self.flush_logs)
+    
+    def pool_status(self) -> Dict[str, Any]:
+        """Return connection pool usage and the number of queued log rows, for monitoring"""
+        pool = self.engine.pool
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_CONFIG["max_overflow"],
+            "status": pool.status(),
+            "pending_log_rows": self._log_queue.qsize()
+        }
     
     @contextmanager
     def get_session(self):
@@ -56,7 +116,6 @@ class DatabaseService:
         """Create a new user and return user data as dict"""
         with self.get_session() as session:
             user = User(
-                user_uuid=str(uuid.uuid4()),
                 full_name=full_name,
                 email=email,
                 password_hash=password_hash,
@@ -64,9 +123,8 @@ class DatabaseService:
             )
             session.add(user)
             session.flush()
-            session.refresh(user)
             # Return as dict to avoid session detachment issues
-            return {
+            user_data = {
                 "id": user.id,
                 "user_uuid": user.user_uuid,
                 "full_name": user.full_name,
@@ -77,48 +135,74 @@ class DatabaseService:
                 "role": user.role,
                 "created_at": user.created_at
             }
+        self._cache_user(("email", email.lower()), {**user_data, "password_hash": password_hash})
+        return user_data
+    
+    def _cached_user(self, key: tuple) -> Optional[dict]:
+        with self._user_cache_lock:
+            user = self._user_cache.get(key)
+        return dict(user) if user else None
+    
+    def _cache_user(self, key: tuple, user: dict):
+        with self._user_cache_lock:
+            self._user_cache[key] = user
+    
+    def _forget_user(self, user_id: int):
+        with self._user_cache_lock:
+            for key in [k for k, v in self._user_cache.items() if v["id"] == user_id]:
+                self._user_cache.pop(key, None)
+    
+    # Column selects skip ORM instance construction and identity-map bookkeeping
+    _USER_BY_EMAIL_COLUMNS = (
+        User.id, User.user_uuid, User.full_name, User.email, User.phone, User.password_hash,
+        User.is_active, User.is_verified, User.role, User.created_at
+    )
+    _USER_BY_UUID_COLUMNS = (
+        User.id, User.user_uuid, User.full_name, User.email, User.phone, User.is_active, User.role
+    )
     
     def get_user_by_email(self, email: str) -> Optional[dict]:
-        """Get user by email"""
+        """Get user by email (cached for user_cache_ttl seconds; misses are not cached)"""
+        key = ("email", email.lower())  # utf8mb4_unicode_ci compares emails case-insensitively
+        user = self._cached_user(key)
+        if user:
+            return user
         with self.get_session() as session:
-            user = session.query(User).filter(User.email == email).first()
-            if user:
-                return {
-                    "id": user.id,
-                    "user_uuid": user.user_uuid,
-                    "full_name": user.full_name,
-                    "email": user.email,
-                    "phone": user.phone,
-                    "password_hash": user.password_hash,
-                    "is_active": user.is_active,
-                    "is_verified": user.is_verified,
-                    "role": user.role,
-                    "created_at": user.created_at
-                }
+            row = session.execute(
+                select(*self._USER_BY_EMAIL_COLUMNS).where(User.email == email).limit(1)
+            ).first()
+        if not row:
             return None
+        user = dict(row._mapping)
+        self._cache_user(key, user)
+        return dict(user)
     
     def get_user_by_uuid(self, user_uuid: str) -> Optional[dict]:
-        """Get user by UUID"""
+        """Get user by UUID (cached for user_cache_ttl seconds; misses are not cached)"""
+        key = ("uuid", user_uuid)
+        user = self._cached_user(key)
+        if user:
+            return user
         with self.get_session() as session:
-            user = session.query(User).filter(User.user_uuid == user_uuid).first()
-            if user:
-                return {
-                    "id": user.id,
-                    "user_uuid": user.user_uuid,
-                    "full_name": user.full_name,
-                    "email": user.email,
-                    "phone": user.phone,
-                    "is_active": user.is_active,
-                    "role": user.role
-                }
+            row = session.execute(
+                select(*self._USER_BY_UUID_COLUMNS).where(User.user_uuid == user_uuid).limit(1)
+            ).first()
+        if not row:
             return None
+        user = dict(row._mapping)
+        self._cache_user(key, user)
+        return dict(user)
     
     def update_last_login(self, user_id: int):
         """Update user's last login timestamp"""
         with self.get_session() as session:
-            session.query(User).filter(User.id == user_id).update({
-                "last_login_at": datetime.utcnow()
-            })
+            session.execute(_UPDATE_LAST_LOGIN, {"uid": user_id, "ts": datetime.utcnow()})
+    
+    def update_password_hash(self, user_id: int, password_hash: str):
+        """Replace a user's stored password hash"""
+        with self.get_session() as session:
+            session.execute(_UPDATE_PASSWORD_HASH, {"uid": user_id, "new_hash": password_hash})
+        self._forget_user(user_id)
     
     # =====================================================
     # ACCESS LOG OPERATIONS
@@ -129,37 +213,34 @@ class DatabaseService:
                    session_id: str = None, ip_address: str = None,
                    user_agent: str = None, request_body: dict = None,
                    response_status_code: int = None, response_time_ms: int = None,
-                   error_message: str = None) -> AccessLog:
-        """Log an API access"""
-        with self.get_session() as session:
-            log = AccessLog(
-                user_id=user_id,
-                user_uuid=user_uuid,
-                session_id=session_id,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                endpoint=endpoint,
-                http_method=http_method,
-                request_body=request_body,
-                response_status_code=response_status_code,
-                response_time_ms=response_time_ms,
-                error_message=error_message
-            )
-            session.add(log)
-            session.flush()
-            return log
+                   error_message: str = None):
+        """Queue an API access log row (written by the background log writer)"""
+        self.enqueue_log(AccessLog.__tablename__, {
+            "user_id": user_id,
+            "user_uuid": user_uuid,
+            "session_id": session_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "endpoint": endpoint,
+            "http_method": http_method,
+            "request_body": request_body,
+            "response_status_code": response_status_code,
+            "response_time_ms": response_time_ms,
+            "error_message": error_message
+        })
     
     def get_access_logs(self, user_id: int = None, endpoint: str = None,
                         start_date: datetime = None, end_date: datetime = None,
                         limit: int = 100) -> List[AccessLog]:
-        """Get access logs with optional filters"""
+        """Get access logs with optional filters (endpoint matches by path prefix, e.g. /api/pdf)"""
         with self.get_session() as session:
             query = session.query(AccessLog)
             
             if user_id:
                 query = query.filter(AccessLog.user_id == user_id)
             if endpoint:
-                query = query.filter(AccessLog.endpoint.like(f"%{endpoint}%"))
+                # Prefix match can range-scan idx_endpoint; a leading wildcard cannot
+                query = query.filter(AccessLog.endpoint.startswith(endpoint, autoescape=True))
             if start_date:
                 query = query.filter(AccessLog.created_at >= start_date)
             if end_date:
@@ -176,7 +257,6 @@ class DatabaseService:
         """Create a new chat session"""
         with self.get_session() as session:
             chat_session = ChatSession(
-                session_uuid=str(uuid.uuid4()),
                 user_id=user_id,
                 title=title,
                 chat_mode=chat_mode,
@@ -184,7 +264,6 @@ class DatabaseService:
             )
             session.add(chat_session)
             session.flush()
-            session.refresh(chat_session)
             return {
                 "id": chat_session.id,
                 "session_uuid": chat_session.session_uuid,
@@ -206,9 +285,7 @@ class DatabaseService:
     def update_session_title(self, session_id: int, title: str):
         """Update chat session title"""
         with self.get_session() as session:
-            session.query(ChatSession).filter(ChatSession.id == session_id).update({
-                "title": title
-            })
+            session.execute(_UPDATE_SESSION_TITLE, {"sid": session_id, "new_title": title})
     
     # =====================================================
     # MESSAGE OPERATIONS
@@ -219,7 +296,6 @@ class DatabaseService:
         """Add a message to a chat session"""
         with self.get_session() as session:
             message = Message(
-                message_uuid=str(uuid.uuid4()),
                 session_id=session_id,
                 role=role,
                 content=content,
@@ -227,21 +303,30 @@ class DatabaseService:
             )
             session.add(message)
             session.flush()
-            session.refresh(message)
-            
-            # Update session's updated_at timestamp
-            session.query(ChatSession).filter(ChatSession.id == session_id).update({
-                "updated_at": datetime.utcnow()
-            })
-            
+            # chat_sessions.updated_at is bumped by the trg_message_session_updated trigger
             return message
     
-    def get_session_messages(self, session_id: int) -> List[Message]:
-        """Get all messages in a chat session"""
+    def iter_session_messages(self, session_id: int, batch_size: int = 200) -> Iterator[Any]:
+        """
+        Stream the messages of a chat session in order, fetching batch_size rows at a time
+        
+        Rows have id, message_uuid, role, content, message_type and created_at. The
+        session stays open until the iterator is exhausted or closed.
+        """
         with self.get_session() as session:
-            return session.query(Message)\
-                .filter(Message.session_id == session_id)\
-                .order_by(Message.created_at.asc()).all()
+            result = session.execute(
+                select(Message.id, Message.message_uuid, Message.role, Message.content,
+                       Message.message_type, Message.created_at)
+                .where(Message.session_id == session_id)
+                .order_by(Message.created_at.asc())
+                .execution_options(yield_per=batch_size)
+            )
+            for partition in result.partitions():
+                yield from partition
+    
+    def get_session_messages(self, session_id: int) -> List[Any]:
+        """Get all messages in a chat session as rows (see iter_session_messages)"""
+        return list(self.iter_session_messages(session_id))
     
     # =====================================================
     # LLM OUTPUT OPERATIONS
@@ -257,7 +342,6 @@ class DatabaseService:
         """Log an LLM output"""
         with self.get_session() as session:
             output = LLMOutput(
-                output_uuid=str(uuid.uuid4()),
                 user_id=user_id,
                 session_id=session_id,
                 message_id=message_id,
@@ -274,7 +358,6 @@ class DatabaseService:
             )
             session.add(output)
             session.flush()
-            session.refresh(output)
             return {
                 "id": output.id,
                 "output_uuid": output.output_uuid,
@@ -310,11 +393,12 @@ class DatabaseService:
                          results_returned: int = 0, response_time_ms: int = None,
                          success: bool = True, error_message: str = None,
                          raw_api_response: dict = None,
-                         case_results: List[Dict] = None) -> dict:
-        """Log a Kanoon search query"""
+                         case_results: List[Dict] = None,
+                         query_uuid: str = None) -> dict:
+        """Log a Kanoon search query (query_uuid may be pre-generated by the caller)"""
         with self.get_session() as session:
             query_obj = KanoonQuery(
-                query_uuid=str(uuid.uuid4()),
+                query_uuid=query_uuid or str(uuid.uuid4()),
                 user_id=user_id,
                 session_id=session_id,
                 message_id=message_id,
@@ -330,22 +414,21 @@ class DatabaseService:
             session.add(query_obj)
             session.flush()
             
-            # Add case results if provided
+            # Add case results if provided, as one executemany
             if case_results:
-                for idx, case in enumerate(case_results):
-                    case_result = KanoonCaseResult(
-                        query_id=query_obj.id,
-                        doc_id=case.get('doc_id', ''),
-                        title=case.get('title', ''),
-                        snippet=case.get('snippet', ''),
-                        case_link=case.get('case_link', ''),
-                        headline=case.get('headline', ''),
-                        result_rank=idx + 1
-                    )
-                    session.add(case_result)
+                session.execute(insert(KanoonCaseResult), [
+                    {
+                        "query_id": query_obj.id,
+                        "doc_id": case.get('doc_id', ''),
+                        "title": case.get('title', ''),
+                        "snippet": case.get('snippet', ''),
+                        "case_link": case.get('case_link', ''),
+                        "headline": case.get('headline', ''),
+                        "result_rank": idx + 1
+                    }
+                    for idx, case in enumerate(case_results)
+                ])
             
-            session.flush()
-            session.refresh(query_obj)
             return {
                 "id": query_obj.id,
                 "query_uuid": query_obj.query_uuid,
@@ -358,14 +441,17 @@ class DatabaseService:
     
     def get_kanoon_queries(self, user_id: int = None, search_term: str = None,
                            start_date: datetime = None, limit: int = 100) -> List[KanoonQuery]:
-        """Get Kanoon queries with optional filters"""
+        """Get Kanoon queries with optional filters (search_term is a full-text word match)"""
         with self.get_session() as session:
             query = session.query(KanoonQuery)
             
             if user_id:
                 query = query.filter(KanoonQuery.user_id == user_id)
             if search_term:
-                query = query.filter(KanoonQuery.search_query.like(f"%{search_term}%"))
+                # Uses the idx_search_query FULLTEXT index instead of a LIKE '%...%' scan
+                query = query.filter(
+                    match(KanoonQuery.search_query, against=search_term).in_natural_language_mode()
+                )
             if start_date:
                 query = query.filter(KanoonQuery.created_at >= start_date)
             
@@ -380,15 +466,14 @@ class DatabaseService:
                        file_content: bytes = None, pages_count: int = None,
                        text_extracted: str = None, chunks_processed: int = 0,
                        faiss_index_path: str = None,
-                       processing_status: str = "pending") -> dict:
-        """Log a PDF upload"""
-        file_hash = None
-        if file_content:
+                       processing_status: str = "pending",
+                       file_hash: str = None) -> dict:
+        """Log a PDF upload (pass file_hash for streamed uploads instead of file_content)"""
+        if file_hash is None and file_content:
             file_hash = hashlib.sha256(file_content).hexdigest()
         
         with self.get_session() as session:
             upload = PDFUpload(
-                upload_uuid=str(uuid.uuid4()),
                 user_id=user_id,
                 session_id=session_id,
                 original_filename=original_filename,
@@ -402,7 +487,6 @@ class DatabaseService:
             )
             session.add(upload)
             session.flush()
-            session.refresh(upload)
             return {
                 "id": upload.id,
                 "upload_uuid": upload.upload_uuid,
@@ -414,6 +498,17 @@ class DatabaseService:
                 "created_at": upload.created_at
             }
     
+    def get_completed_pdf_upload(self, file_hash: str) -> Optional[dict]:
+        """Get the latest successfully processed upload of a file by its SHA-256, if any"""
+        with self.get_session() as session:
+            row = session.execute(
+                select(PDFUpload.id, PDFUpload.upload_uuid, PDFUpload.pages_count, PDFUpload.chunks_processed)
+                .where(PDFUpload.file_hash == file_hash, PDFUpload.processing_status == "completed")
+                .order_by(PDFUpload.id.desc())
+                .limit(1)
+            ).first()
+            return dict(row._mapping) if row else None
+    
     def update_pdf_processing_status(self, upload_id: int, status: str,
                                       chunks_processed: int = None,
                                       error_message: str = None):
@@ -428,19 +523,154 @@ class DatabaseService:
             if error_message:
                 update_data["error_message"] = error_message
             
-            session.query(PDFUpload).filter(PDFUpload.id == upload_id).update(update_data)
+            # The SET columns vary, so this one relies on SQLAlchemy's compiled statement cache
+            session.execute(
+                update(PDFUpload).where(PDFUpload.id == upload_id).values(update_data)
+                .execution_options(synchronize_session=False)
+            )
+    
+    @staticmethod
+    def _pdf_chunk_rows(upload_id: int, chunks: List[str]) -> List[dict]:
+        return [
+            {
+                "upload_id": upload_id,
+                "chunk_index": idx,
+                "chunk_text": chunk_text,
+                "chunk_hash": hashlib.sha256(chunk_text.encode()).hexdigest()
+            }
+            for idx, chunk_text in enumerate(chunks)
+        ]
     
     def add_pdf_chunks(self, upload_id: int, chunks: List[str]):
         """Add text chunks for a PDF upload"""
+        if not chunks:
+            return
+        rows = self._pdf_chunk_rows(upload_id, chunks)
         with self.get_session() as session:
-            for idx, chunk_text in enumerate(chunks):
-                chunk = PDFTextChunk(
-                    upload_id=upload_id,
-                    chunk_index=idx,
-                    chunk_text=chunk_text,
-                    chunk_hash=hashlib.sha256(chunk_text.encode()).hexdigest()
+            # One executemany (multi-row INSERT) instead of a unit-of-work flush per object
+            session.execute(insert(PDFTextChunk), rows)
+    
+    def complete_pdf_uploads(self, chunks_by_upload: Dict[int, List[str]]):
+        """
+        Store the chunks of several processed uploads and mark them all completed
+        
+        One transaction with a single chunk INSERT and a single CASE-based UPDATE,
+        instead of a status UPDATE and chunk INSERT per upload
+        
+        Args:
+            chunks_by_upload: Text chunks keyed by upload id
+        """
+        if not chunks_by_upload:
+            return
+        rows = [row for upload_id, chunks in chunks_by_upload.items()
+                for row in self._pdf_chunk_rows(upload_id, chunks)]
+        with self.get_session() as session:
+            if rows:
+                session.execute(insert(PDFTextChunk), rows)
+            session.execute(
+                update(PDFUpload)
+                .where(PDFUpload.id.in_(list(chunks_by_upload)))
+                .values(
+                    processing_status="completed",
+                    processed_at=datetime.utcnow(),
+                    chunks_processed=case(
+                        {upload_id: len(chunks) for upload_id, chunks in chunks_by_upload.items()},
+                        value=PDFUpload.id
+                    )
                 )
-                session.add(chunk)
+                .execution_options(synchronize_session=False)
+            )
+    
+    # =====================================================
+    # BATCHED LOG WRITES
+    # =====================================================
+    
+    LOG_TABLES = {
+        AccessLog.__tablename__: AccessLog,
+        LLMOutput.__tablename__: LLMOutput,
+        Feedback.__tablename__: Feedback
+    }
+    LOG_BATCH_SIZE = 1000       # Rows per flush
+    LOG_FLUSH_INTERVAL = 0.5    # Seconds to wait for a batch to fill
+    LOG_RETRY_DELAY = 1.0       # Seconds before retrying a failed batch insert
+    
+    def insert_log_rows(self, table: str, rows: List[dict]):
+        """
+        Insert log rows for one table as a single executemany in its own transaction
+        
+        Args:
+            table: Table name (access_logs, llm_outputs, feedback)
+            rows: Column dicts for the table
+        """
+        if not rows:
+            return
+        with self.get_session() as session:
+            session.execute(insert(self.LOG_TABLES[table]), rows)
+    
+    def enqueue_log(self, table: str, row: dict):
+        """Queue a log row for the background writer; drops it if the queue is full"""
+        try:
+            self._log_queue.put_nowait((table, row))
+        except queue.Full:
+            logger.warning("⚠️ Log queue full, dropping %s row", table)
+    
+    def _write_log_batch(self, batch: List[tuple]):
+        rows_by_table: Dict[str, List[dict]] = {}
+        for table, row in batch:
+            rows_by_table.setdefault(table, []).append(row)
+        # Each table commits on its own, so a failure in one cannot discard the others
+        for table, rows in rows_by_table.items():
+            try:
+                self.insert_log_rows(table, rows)
+                continue
+            except Exception as e:
+                logger.warning("⚠️ Failed to write %d %s rows, retrying: %s", len(rows), table, e)
+            
+            # Retry once after a pause (covers a brief DB outage or failover)
+            time.sleep(self.LOG_RETRY_DELAY)
+            try:
+                self.insert_log_rows(table, rows)
+                continue
+            except Exception as e:
+                logger.warning("⚠️ Retry of %d %s rows failed, inserting row by row: %s",
+                               len(rows), table, e)
+            
+            # Isolate bad rows so they do not take the rest of the batch with them
+            dropped = 0
+            for row in rows:
+                try:
+                    self.insert_log_rows(table, [row])
+                except Exception:
+                    dropped += 1
+                    logger.exception("❌ Dropping unwritable %s row", table)
+            if dropped:
+                logger.error("❌ Dropped %d of %d %s rows", dropped, len(rows), table)
+    
+    def _drain_logs(self):
+        """Writer thread: insert up to LOG_BATCH_SIZE rows every LOG_FLUSH_INTERVAL seconds"""
+        while True:
+            batch = [self._log_queue.get()]
+            deadline = time.monotonic() + self.LOG_FLUSH_INTERVAL
+            while len(batch) < self.LOG_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._log_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write_log_batch(batch)
+    
+    def flush_logs(self):
+        """Write any queued log rows now (called on shutdown)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write_log_batch(batch)
     
     # =====================================================
     # FEEDBACK OPERATIONS
@@ -453,7 +683,6 @@ class DatabaseService:
         """Add user feedback"""
         with self.get_session() as session:
             feedback = Feedback(
-                feedback_uuid=str(uuid.uuid4()),
                 user_id=user_id,
                 message_id=message_id,
                 llm_output_id=llm_output_id,
@@ -464,7 +693,6 @@ class DatabaseService:
             )
             session.add(feedback)
             session.flush()
-            session.refresh(feedback)
             return {
                 "id": feedback.id,
                 "feedback_uuid": feedback.feedback_uuid,
@@ -477,37 +705,50 @@ class DatabaseService:
     # ANALYTICS OPERATIONS
     # =====================================================
     
+    def _fetch_raw(self, sql: str, params: tuple) -> tuple:
+        """Run a read-only query on a raw DB-API cursor, returning plain tuples"""
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+    
+    @cached(_DAILY_STATS_CACHE, key=methodkey, lock=_ANALYTICS_CACHE_LOCK)
     def get_daily_stats(self, days: int = 30) -> List[Dict]:
-        """Get daily statistics for the last N days"""
-        with self.get_session() as session:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            
-            results = session.execute(text("""
-                SELECT 
-                    DATE(created_at) as date,
-                    COUNT(*) as total_requests,
-                    COUNT(DISTINCT user_id) as unique_users
-                FROM access_logs
-                WHERE created_at >= :start_date
-                GROUP BY DATE(created_at)
-                ORDER BY date DESC
-            """), {"start_date": start_date})
-            
-            return [{"date": row[0], "total_requests": row[1], "unique_users": row[2]} 
-                    for row in results]
+        """Get daily statistics for the last N days (cached for analytics_cache_ttl seconds)"""
+        start_date = datetime.utcnow() - timedelta(days=days)
+        rows = self._fetch_raw("""
+            SELECT 
+                DATE(created_at) as date,
+                COUNT(*) as total_requests,
+                COUNT(DISTINCT user_id) as unique_users
+            FROM access_logs
+            WHERE created_at >= %s
+            GROUP BY DATE(created_at)
+            ORDER BY date DESC
+        """, (start_date,))
+        
+        return [{"date": row[0], "total_requests": row[1], "unique_users": row[2]} 
+                for row in rows]
     
+    @cached(_POPULAR_SEARCHES_CACHE, key=methodkey, lock=_ANALYTICS_CACHE_LOCK)
     def get_popular_searches(self, limit: int = 10) -> List[Dict]:
-        """Get most popular Kanoon searches"""
-        with self.get_session() as session:
-            results = session.query(
-                KanoonQuery.search_query,
-                text("COUNT(*) as count")
-            ).filter(KanoonQuery.success == True)\
-             .group_by(KanoonQuery.search_query)\
-             .order_by(text("count DESC"))\
-             .limit(limit).all()
-            
-            return [{"query": row[0], "count": row[1]} for row in results]
+        """Get most popular Kanoon searches (cached for analytics_cache_ttl seconds)"""
+        rows = self._fetch_raw("""
+            SELECT search_query, COUNT(*) as count
+            FROM kanoon_queries
+            WHERE success = TRUE
+            GROUP BY search_query
+            ORDER BY count DESC
+            LIMIT %s
+        """, (limit,))
+        
+        return [{"query": row[0], "count": row[1]} for row in rows]
 
 
 # Create a global instance
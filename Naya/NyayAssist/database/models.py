@@ -8,18 +8,53 @@ from typing import Optional, List
 from sqlalchemy import (
     Column, Integer, BigInteger, String, Text, Boolean, 
     DateTime, Enum, ForeignKey, JSON, DECIMAL, LargeBinary,
-    Index, UniqueConstraint, create_engine
+    Index, UniqueConstraint, event, DDL, TypeDecorator, func
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
-from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.mysql import LONGTEXT, BINARY
 import uuid
 
-from .db_config import get_database_url
 
 Base = declarative_base()
 
 
+class UUIDBinary(TypeDecorator):
+    """UUID stored as 16 raw bytes (BINARY(16)), exposed to Python as the usual 36-char string"""
+    
+    impl = BINARY(16)
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, uuid.UUID):
+            return value.bytes
+        return uuid.UUID(value).bytes
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return str(uuid.UUID(bytes=bytes(value)))
+
+
+class SHA256Binary(TypeDecorator):
+    """SHA-256 digest stored as 32 raw bytes (BINARY(32)), exposed to Python as a hex string"""
+    
+    impl = BINARY(32)
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        return bytes.fromhex(value)
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return bytes(value).hex()
+
+
 # =====================================================
 # USER MODELS
 # =====================================================
@@ -42,13 +77,13 @@ class User(Base):
     last_login_at = Column(DateTime)
     
     # Relationships
-    chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete-orphan")
-    access_logs = relationship("AccessLog", back_populates="user")
-    llm_outputs = relationship("LLMOutput", back_populates="user")
-    kanoon_queries = relationship("KanoonQuery", back_populates="user")
-    pdf_uploads = relationship("PDFUpload", back_populates="user")
-    user_sessions = relationship("UserSession", back_populates="user", cascade="all, delete-orphan")
-    feedbacks = relationship("Feedback", back_populates="user")
+    chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete-orphan", lazy="raise", passive_deletes=True)
+    access_logs = relationship("AccessLog", back_populates="user", lazy="raise", passive_deletes=True)
+    llm_outputs = relationship("LLMOutput", back_populates="user", lazy="raise", passive_deletes=True)
+    kanoon_queries = relationship("KanoonQuery", back_populates="user", lazy="raise", passive_deletes=True)
+    pdf_uploads = relationship("PDFUpload", back_populates="user", lazy="raise", passive_deletes=True)
+    user_sessions = relationship("UserSession", back_populates="user", cascade="all, delete-orphan", lazy="raise", passive_deletes=True)
+    feedbacks = relationship("Feedback", back_populates="user", lazy="raise", passive_deletes=True)
 
 
 class UserSession(Base):
@@ -65,7 +100,7 @@ class UserSession(Base):
     last_activity_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="user_sessions")
+    user = relationship("User", back_populates="user_sessions", lazy="raise")
 
 
 # =====================================================
@@ -90,7 +125,12 @@ class AccessLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="access_logs")
+    user = relationship("User", back_populates="access_logs", lazy="raise")
+    
+    # Composite indexes match the filter + ORDER BY created_at DESC lookups
+    __table_args__ = (
+        Index('idx_user_created', 'user_id', 'created_at'),
+    )
 
 
 # =====================================================
@@ -111,11 +151,15 @@ class ChatSession(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="chat_sessions")
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
-    llm_outputs = relationship("LLMOutput", back_populates="session")
-    kanoon_queries = relationship("KanoonQuery", back_populates="session")
-    pdf_uploads = relationship("PDFUpload", back_populates="session")
+    user = relationship("User", back_populates="chat_sessions", lazy="raise")
+    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan", lazy="raise", passive_deletes=True)
+    llm_outputs = relationship("LLMOutput", back_populates="session", lazy="raise", passive_deletes=True)
+    kanoon_queries = relationship("KanoonQuery", back_populates="session", lazy="raise", passive_deletes=True)
+    pdf_uploads = relationship("PDFUpload", back_populates="session", lazy="raise", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('idx_user_archived_updated', 'user_id', 'is_archived', 'updated_at'),
+    )
 
 
 class Message(Base):
@@ -130,10 +174,28 @@ class Message(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    session = relationship("ChatSession", back_populates="messages")
-    llm_outputs = relationship("LLMOutput", back_populates="message")
-    kanoon_queries = relationship("KanoonQuery", back_populates="message")
-    feedbacks = relationship("Feedback", back_populates="message")
+    session = relationship("ChatSession", back_populates="messages", lazy="raise")
+    llm_outputs = relationship("LLMOutput", back_populates="message", lazy="raise", passive_deletes=True)
+    kanoon_queries = relationship("KanoonQuery", back_populates="message", lazy="raise", passive_deletes=True)
+    feedbacks = relationship("Feedback", back_populates="message", lazy="raise", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('idx_session_created', 'session_id', 'created_at'),
+    )
+
+
+# Bump the parent session's updated_at on each new message inside the INSERT,
+# so add_message does not need a second UPDATE statement (mirrors schema.sql)
+event.listen(
+    Message.__table__,
+    "after_create",
+    DDL("""
+        CREATE TRIGGER trg_message_session_updated
+        AFTER INSERT ON messages
+        FOR EACH ROW
+        UPDATE chat_sessions SET updated_at = NEW.created_at WHERE id = NEW.session_id
+    """).execute_if(dialect="mysql")
+)
 
 
 # =====================================================
@@ -167,10 +229,15 @@ class LLMOutput(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="llm_outputs")
-    session = relationship("ChatSession", back_populates="llm_outputs")
-    message = relationship("Message", back_populates="llm_outputs")
-    feedbacks = relationship("Feedback", back_populates="llm_output")
+    user = relationship("User", back_populates="llm_outputs", lazy="raise")
+    session = relationship("ChatSession", back_populates="llm_outputs", lazy="raise")
+    message = relationship("Message", back_populates="llm_outputs", lazy="raise")
+    feedbacks = relationship("Feedback", back_populates="llm_output", lazy="raise", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('idx_user_created', 'user_id', 'created_at'),
+        Index('idx_session_created', 'session_id', 'created_at'),
+    )
 
 
 # =====================================================
@@ -181,7 +248,7 @@ class KanoonQuery(Base):
     __tablename__ = 'kanoon_queries'
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    query_uuid = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    query_uuid = Column(UUIDBinary, unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
     session_id = Column(Integer, ForeignKey('chat_sessions.id', ondelete='SET NULL'))
     message_id = Column(BigInteger, ForeignKey('messages.id', ondelete='SET NULL'))
@@ -202,11 +269,18 @@ class KanoonQuery(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="kanoon_queries")
-    session = relationship("ChatSession", back_populates="kanoon_queries")
-    message = relationship("Message", back_populates="kanoon_queries")
-    case_results = relationship("KanoonCaseResult", back_populates="query", cascade="all, delete-orphan")
-    feedbacks = relationship("Feedback", back_populates="kanoon_query")
+    user = relationship("User", back_populates="kanoon_queries", lazy="raise")
+    session = relationship("ChatSession", back_populates="kanoon_queries", lazy="raise")
+    message = relationship("Message", back_populates="kanoon_queries", lazy="raise")
+    # Always read together with the query (~10 rows), so loaded eagerly with one IN() query
+    case_results = relationship("KanoonCaseResult", back_populates="query", cascade="all, delete-orphan", lazy="selectin", passive_deletes=True)
+    feedbacks = relationship("Feedback", back_populates="kanoon_query", lazy="raise", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('idx_user_created', 'user_id', 'created_at'),
+        Index('idx_session_created', 'session_id', 'created_at'),
+        Index('idx_search_query', 'search_query', mysql_prefix='FULLTEXT'),
+    )
 
 
 class KanoonCaseResult(Base):
@@ -220,10 +294,10 @@ class KanoonCaseResult(Base):
     case_link = Column(String(500))
     headline = Column(Text)
     result_rank = Column(Integer)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
-    query = relationship("KanoonQuery", back_populates="case_results")
+    query = relationship("KanoonQuery", back_populates="case_results", lazy="raise")
 
 
 # =====================================================
@@ -234,19 +308,19 @@ class PDFUpload(Base):
     __tablename__ = 'pdf_uploads'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    upload_uuid = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    upload_uuid = Column(UUIDBinary, unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
     session_id = Column(Integer, ForeignKey('chat_sessions.id', ondelete='SET NULL'))
     
     # File details
     original_filename = Column(String(255), nullable=False)
     file_size_bytes = Column(BigInteger)
-    file_hash = Column(String(64))
+    file_hash = Column(SHA256Binary)
     mime_type = Column(String(100), default='application/pdf')
     
     # Processing details
     pages_count = Column(Integer)
-    text_extracted = Column(LONGTEXT)
+    text_extracted = deferred(Column(LONGTEXT))  # Only loaded when accessed
     chunks_processed = Column(Integer, default=0)
     chunk_size = Column(Integer, default=10000)
     chunk_overlap = Column(Integer, default=1000)
@@ -262,9 +336,13 @@ class PDFUpload(Base):
     processed_at = Column(DateTime)
     
     # Relationships
-    user = relationship("User", back_populates="pdf_uploads")
-    session = relationship("ChatSession", back_populates="pdf_uploads")
-    text_chunks = relationship("PDFTextChunk", back_populates="upload", cascade="all, delete-orphan")
+    user = relationship("User", back_populates="pdf_uploads", lazy="raise")
+    session = relationship("ChatSession", back_populates="pdf_uploads", lazy="raise")
+    text_chunks = relationship("PDFTextChunk", back_populates="upload", cascade="all, delete-orphan", lazy="raise", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('idx_file_hash', 'file_hash'),
+    )
 
 
 class PDFTextChunk(Base):
@@ -274,11 +352,11 @@ class PDFTextChunk(Base):
     upload_id = Column(Integer, ForeignKey('pdf_uploads.id', ondelete='CASCADE'), nullable=False)
     chunk_index = Column(Integer, nullable=False)
     chunk_text = Column(LONGTEXT, nullable=False)
-    chunk_hash = Column(String(64))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    chunk_hash = Column(SHA256Binary)
+    created_at = Column(DateTime, server_default=func.now())
     
     # Relationships
-    upload = relationship("PDFUpload", back_populates="text_chunks")
+    upload = relationship("PDFUpload", back_populates="text_chunks", lazy="raise")
     
     __table_args__ = (
         UniqueConstraint('upload_id', 'chunk_index', name='uk_upload_chunk'),
@@ -293,12 +371,76 @@ class APIRateLimit(Base):
     __tablename__ = 'api_rate_limits'
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+    user_id = Column(Integer)  # No FK: partitioned InnoDB tables cannot have foreign keys
     ip_address = Column(String(45))
     endpoint = Column(String(255), nullable=False)
     request_count = Column(Integer, default=1)
-    window_start = Column(DateTime, default=datetime.utcnow)
-    window_end = Column(DateTime, nullable=False)
+    window_start = Column(DateTime, server_default=func.now())
+    # Part of the primary key because MySQL requires the partitioning column in every unique key
+    window_end = Column(DateTime, primary_key=True, nullable=False)
+    
+    # Rate-limit checks seek by (user or IP, endpoint, window_end). Rows are partitioned by
+    # day of window_end so expired windows are dropped a partition at a time (see schema.sql)
+    __table_args__ = (
+        Index('idx_user_endpoint_window', 'user_id', 'endpoint', 'window_end'),
+        Index('idx_ip_endpoint_window', 'ip_address', 'endpoint', 'window_end'),
+        {
+            'mysql_partition_by': 'RANGE (TO_DAYS(window_end)) '
+                                  '(PARTITION p_future VALUES LESS THAN MAXVALUE)',
+        },
+    )
+
+
+# Daily partition rotation for api_rate_limits, created with the table so databases
+# built through init_db()/create_all get it too (mirrors schema.sql; needs event_scheduler=ON)
+event.listen(
+    APIRateLimit.__table__,
+    "after_create",
+    DDL("""
+        CREATE PROCEDURE sp_rotate_rate_limit_partitions()
+        BEGIN
+            DECLARE expired TEXT;
+            
+            SET @bound = TO_DAYS(CURDATE() + INTERVAL 2 DAY);
+            SET @partition_name = CONCAT('p', @bound);
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'api_rate_limits'
+                  AND PARTITION_NAME = @partition_name
+            ) THEN
+                SET @ddl = CONCAT(
+                    'ALTER TABLE api_rate_limits REORGANIZE PARTITION p_future INTO (',
+                    'PARTITION ', @partition_name, ' VALUES LESS THAN (', @bound, '), ',
+                    'PARTITION p_future VALUES LESS THAN MAXVALUE)'
+                );
+                PREPARE stmt FROM @ddl;
+                EXECUTE stmt;
+                DEALLOCATE PREPARE stmt;
+            END IF;
+            
+            SELECT GROUP_CONCAT(PARTITION_NAME) INTO expired
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'api_rate_limits'
+              AND PARTITION_NAME <> 'p_future'
+              AND CAST(PARTITION_DESCRIPTION AS UNSIGNED) <= TO_DAYS(CURDATE());
+            IF expired IS NOT NULL THEN
+                SET @ddl = CONCAT('ALTER TABLE api_rate_limits DROP PARTITION ', expired);
+                PREPARE stmt FROM @ddl;
+                EXECUTE stmt;
+                DEALLOCATE PREPARE stmt;
+            END IF;
+        END
+    """).execute_if(dialect="mysql")
+)
+event.listen(
+    APIRateLimit.__table__,
+    "after_create",
+    DDL("""
+        CREATE EVENT evt_rotate_rate_limit_partitions
+        ON SCHEDULE EVERY 1 DAY STARTS CURRENT_TIMESTAMP
+        DO CALL sp_rotate_rate_limit_partitions()
+    """).execute_if(dialect="mysql")
+)
 
 
 class Analytics(Base):
@@ -309,7 +451,7 @@ class Analytics(Base):
     metric_type = Column(Enum('daily_users', 'daily_queries', 'pdf_uploads', 'kanoon_searches', 'llm_calls'), nullable=False)
     metric_value = Column(Integer, default=0)
     additional_data = Column(JSON)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     __table_args__ = (
         UniqueConstraint('date', 'metric_type', name='uk_date_metric'),
@@ -320,7 +462,7 @@ class Feedback(Base):
     __tablename__ = 'feedback'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    feedback_uuid = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    feedback_uuid = Column(UUIDBinary, unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
     message_id = Column(BigInteger, ForeignKey('messages.id', ondelete='SET NULL'))
     llm_output_id = Column(BigInteger, ForeignKey('llm_outputs.id', ondelete='SET NULL'))
@@ -332,10 +474,10 @@ class Feedback(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="feedbacks")
-    message = relationship("Message", back_populates="feedbacks")
-    llm_output = relationship("LLMOutput", back_populates="feedbacks")
-    kanoon_query = relationship("KanoonQuery", back_populates="feedbacks")
+    user = relationship("User", back_populates="feedbacks", lazy="raise")
+    message = relationship("Message", back_populates="feedbacks", lazy="raise")
+    llm_output = relationship("LLMOutput", back_populates="feedbacks", lazy="raise")
+    kanoon_query = relationship("KanoonQuery", back_populates="feedbacks", lazy="raise")
 
 
 # =====================================================
@@ -343,14 +485,13 @@ class Feedback(Base):
 # =====================================================
 
 def init_db():
-    """Initialize the database and create all tables"""
-    engine = create_engine(get_database_url(), echo=True)
-    Base.metadata.create_all(engine)
-    return engine
+    """Initialize the database and create all tables (on the shared service engine)"""
+    from .db_service import db_service  # Imported here: db_service imports these models
+    Base.metadata.create_all(db_service.engine)
+    return db_service.engine
 
 
 def get_session():
-    """Get a database session"""
-    engine = create_engine(get_database_url())
-    Session = sessionmaker(bind=engine)
-    return Session()
+    """Get a database session from the shared service engine's connection pool"""
+    from .db_service import db_service
+    return db_service.SessionLocal()
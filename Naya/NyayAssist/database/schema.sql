@@ -44,6 +44,7 @@ CREATE TABLE access_logs (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
     INDEX idx_user_id (user_id),
+    INDEX idx_user_created (user_id, created_at),
     INDEX idx_endpoint (endpoint),
     INDEX idx_created_at (created_at),
     INDEX idx_session_id (session_id)
@@ -65,7 +66,8 @@ CREATE TABLE chat_sessions (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
     INDEX idx_session_uuid (session_uuid),
-    INDEX idx_chat_mode (chat_mode)
+    INDEX idx_chat_mode (chat_mode),
+    INDEX idx_user_archived_updated (user_id, is_archived, updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- =====================================================
@@ -82,7 +84,8 @@ CREATE TABLE messages (
     FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE,
     INDEX idx_session_id (session_id),
     INDEX idx_message_uuid (message_uuid),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_session_created (session_id, created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- =====================================================
@@ -118,7 +121,9 @@ CREATE TABLE llm_outputs (
     INDEX idx_user_id (user_id),
     INDEX idx_session_id (session_id),
     INDEX idx_model_name (model_name),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_user_created (user_id, created_at),
+    INDEX idx_session_created (session_id, created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- =====================================================
@@ -126,7 +131,7 @@ CREATE TABLE llm_outputs (
 -- =====================================================
 CREATE TABLE kanoon_queries (
     id BIGINT AUTO_INCREMENT PRIMARY KEY,
-    query_uuid VARCHAR(36) UNIQUE NOT NULL,
+    query_uuid BINARY(16) UNIQUE NOT NULL,
     user_id INT NULL,
     session_id INT NULL,
     message_id BIGINT NULL,
@@ -152,6 +157,8 @@ CREATE TABLE kanoon_queries (
     INDEX idx_user_id (user_id),
     INDEX idx_session_id (session_id),
     INDEX idx_created_at (created_at),
+    INDEX idx_user_created (user_id, created_at),
+    INDEX idx_session_created (session_id, created_at),
     FULLTEXT INDEX idx_search_query (search_query)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -179,14 +186,14 @@ CREATE TABLE kanoon_case_results (
 -- =====================================================
 CREATE TABLE pdf_uploads (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    upload_uuid VARCHAR(36) UNIQUE NOT NULL,
+    upload_uuid BINARY(16) UNIQUE NOT NULL,
     user_id INT NULL,
     session_id INT NULL,
     
     -- File details
     original_filename VARCHAR(255) NOT NULL,
     file_size_bytes BIGINT,
-    file_hash VARCHAR(64),  -- SHA-256 hash for deduplication
+    file_hash BINARY(32),  -- SHA-256 digest for deduplication
     mime_type VARCHAR(100) DEFAULT 'application/pdf',
     
     -- Processing details
@@ -222,7 +229,7 @@ CREATE TABLE pdf_text_chunks (
     upload_id INT NOT NULL,
     chunk_index INT NOT NULL,
     chunk_text LONGTEXT NOT NULL,
-    chunk_hash VARCHAR(64),
+    chunk_hash BINARY(32),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     FOREIGN KEY (upload_id) REFERENCES pdf_uploads(id) ON DELETE CASCADE,
@@ -252,21 +259,28 @@ CREATE TABLE user_sessions (
 
 -- =====================================================
 -- 11. API RATE LIMITS TABLE - Track rate limiting
+-- Partitioned by day of window_end; evt_rotate_rate_limit_partitions adds
+-- tomorrow's partition and drops expired ones (no FK: partitioned tables
+-- cannot have foreign keys, and expired rows are dropped with their partition)
 -- =====================================================
 CREATE TABLE api_rate_limits (
-    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    id BIGINT AUTO_INCREMENT,
     user_id INT NULL,
     ip_address VARCHAR(45),
     endpoint VARCHAR(255) NOT NULL,
     request_count INT DEFAULT 1,
     window_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    window_end TIMESTAMP NOT NULL,
+    window_end DATETIME NOT NULL,
     
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    PRIMARY KEY (id, window_end),
     INDEX idx_user_id (user_id),
     INDEX idx_ip_address (ip_address),
-    INDEX idx_window_end (window_end)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    INDEX idx_user_endpoint_window (user_id, endpoint, window_end),
+    INDEX idx_ip_endpoint_window (ip_address, endpoint, window_end)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+PARTITION BY RANGE (TO_DAYS(window_end)) (
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
 
 -- =====================================================
 -- 12. ANALYTICS TABLE - Aggregate analytics data
@@ -289,7 +303,7 @@ CREATE TABLE analytics (
 -- =====================================================
 CREATE TABLE feedback (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    feedback_uuid VARCHAR(36) UNIQUE NOT NULL,
+    feedback_uuid BINARY(16) UNIQUE NOT NULL,
     user_id INT NULL,
     message_id BIGINT NULL,
     llm_output_id BIGINT NULL,
@@ -438,7 +452,7 @@ BEGIN
         page_number, total_results_found, results_returned, response_time_ms,
         success, error_message, raw_api_response
     ) VALUES (
-        p_query_uuid, p_user_id, p_session_id, p_message_id, p_search_query,
+        UUID_TO_BIN(p_query_uuid), p_user_id, p_session_id, p_message_id, p_search_query,
         p_page_number, p_total_results_found, p_results_returned, p_response_time_ms,
         p_success, p_error_message, p_raw_api_response
     );
@@ -448,9 +462,47 @@ END //
 CREATE PROCEDURE sp_cleanup_old_logs()
 BEGIN
     DELETE FROM access_logs WHERE created_at < DATE_SUB(NOW(), INTERVAL 90 DAY);
+    -- Fallback for when the event scheduler is off (partition rotation normally empties these)
     DELETE FROM api_rate_limits WHERE window_end < NOW();
 END //
 
+-- Procedure: Split tomorrow's partition off p_future and drop partitions of expired rate-limit windows
+CREATE PROCEDURE sp_rotate_rate_limit_partitions()
+BEGIN
+    DECLARE expired TEXT;
+    
+    -- Partitions are named after their TO_DAYS upper bound; tomorrow's ends at the day after
+    SET @bound = TO_DAYS(CURDATE() + INTERVAL 2 DAY);
+    SET @partition_name = CONCAT('p', @bound);
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'api_rate_limits'
+          AND PARTITION_NAME = @partition_name
+    ) THEN
+        SET @ddl = CONCAT(
+            'ALTER TABLE api_rate_limits REORGANIZE PARTITION p_future INTO (',
+            'PARTITION ', @partition_name, ' VALUES LESS THAN (', @bound, '), ',
+            'PARTITION p_future VALUES LESS THAN MAXVALUE)'
+        );
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+    
+    -- Partitions bounded at or before today only hold windows that have ended
+    SELECT GROUP_CONCAT(PARTITION_NAME) INTO expired
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'api_rate_limits'
+      AND PARTITION_NAME <> 'p_future'
+      AND CAST(PARTITION_DESCRIPTION AS UNSIGNED) <= TO_DAYS(CURDATE());
+    IF expired IS NOT NULL THEN
+        SET @ddl = CONCAT('ALTER TABLE api_rate_limits DROP PARTITION ', expired);
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END //
+
 DELIMITER ;
 
 -- =====================================================
@@ -489,8 +541,56 @@ BEGIN
     ON DUPLICATE KEY UPDATE metric_value = metric_value + 1;
 END //
 
+-- Trigger: Mark the chat session as updated when a message is added
+CREATE TRIGGER trg_message_session_updated
+AFTER INSERT ON messages
+FOR EACH ROW
+BEGIN
+    UPDATE chat_sessions SET updated_at = NEW.created_at WHERE id = NEW.session_id;
+END //
+
 DELIMITER ;
 
+-- =====================================================
+-- EVENTS (requires event_scheduler=ON)
+-- =====================================================
+
+CREATE EVENT evt_rotate_rate_limit_partitions
+ON SCHEDULE EVERY 1 DAY STARTS CURRENT_TIMESTAMP
+DO CALL sp_rotate_rate_limit_partitions();
+
+-- =====================================================
+-- UPGRADING AN EXISTING DATABASE
+-- =====================================================
+
+-- Composite indexes for the filtered, time-ordered history queries
+-- ALTER TABLE access_logs ADD INDEX idx_user_created (user_id, created_at);
+-- ALTER TABLE chat_sessions ADD INDEX idx_user_archived_updated (user_id, is_archived, updated_at);
+-- ALTER TABLE messages ADD INDEX idx_session_created (session_id, created_at);
+-- ALTER TABLE llm_outputs ADD INDEX idx_user_created (user_id, created_at), ADD INDEX idx_session_created (session_id, created_at);
+-- ALTER TABLE kanoon_queries ADD INDEX idx_user_created (user_id, created_at), ADD INDEX idx_session_created (session_id, created_at);
+-- ALTER TABLE api_rate_limits ADD INDEX idx_user_endpoint_window (user_id, endpoint, window_end), ADD INDEX idx_ip_endpoint_window (ip_address, endpoint, window_end);
+
+-- Store query/upload/feedback UUIDs as BINARY(16) (repeat for pdf_uploads.upload_uuid and feedback.feedback_uuid)
+-- ALTER TABLE kanoon_queries ADD COLUMN query_uuid_bin BINARY(16) NULL AFTER query_uuid;
+-- UPDATE kanoon_queries SET query_uuid_bin = UUID_TO_BIN(query_uuid);
+-- ALTER TABLE kanoon_queries DROP COLUMN query_uuid, RENAME COLUMN query_uuid_bin TO query_uuid,
+--     MODIFY query_uuid BINARY(16) NOT NULL, ADD UNIQUE INDEX query_uuid (query_uuid);
+
+-- Store SHA-256 hashes as raw BINARY(32) digests
+-- ALTER TABLE pdf_uploads ADD COLUMN file_hash_bin BINARY(32) NULL AFTER file_hash;
+-- UPDATE pdf_uploads SET file_hash_bin = UNHEX(file_hash);
+-- ALTER TABLE pdf_uploads DROP COLUMN file_hash, RENAME COLUMN file_hash_bin TO file_hash, ADD INDEX idx_file_hash (file_hash);
+-- ALTER TABLE pdf_text_chunks ADD COLUMN chunk_hash_bin BINARY(32) NULL AFTER chunk_hash;
+-- UPDATE pdf_text_chunks SET chunk_hash_bin = UNHEX(chunk_hash);
+-- ALTER TABLE pdf_text_chunks DROP COLUMN chunk_hash, RENAME COLUMN chunk_hash_bin TO chunk_hash;
+
+-- Partition api_rate_limits by day: its rows are transient, so recreate the table from the
+-- CREATE TABLE above, then create sp_rotate_rate_limit_partitions and evt_rotate_rate_limit_partitions
+-- DROP TABLE api_rate_limits;
+
+-- Also create trg_message_session_updated from the TRIGGERS section above if it is missing
+
 -- =====================================================
 -- SAMPLE DATA (Optional - for testing)
 -- =====================================================
@@ -4,11 +4,21 @@ Utilities for detecting law sections and providing comparisons between old and n
 """
 
 import re
-import json
 import os
-from typing import List, Dict, Optional, Tuple
+import hashlib
+import threading
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
 from pathlib import Path
 
+import orjson
+from cachetools import LRUCache, cached
+
+try:
+    import re2  # google-re2: linear-time DFA matching, same API as re
+except ImportError:  # RE2 is optional, fall back to the standard library engine
+    re2 = None
+
 # Regex patterns for detecting law sections
 PATTERNS = {
     'IPC': [
@@ -33,6 +43,19 @@ PATTERNS = {
     ]
 }
 
+# Patterns precompiled once, in law/pattern order. Each is scanned separately so
+# overlapping references (e.g. "498A IPC Section 34") are all found.
+# The patterns are purely regular (no backreferences/lookaround), so RE2 can run them.
+_SECTION_PATTERNS = tuple(
+    (law_type, (re2 or re).compile('(?i)' + pattern))
+    for law_type, patterns in PATTERNS.items()
+    for pattern in patterns
+)
+
+# Every pattern contains one of these words, so text without them cannot match;
+# most chat answers mention no law and are rejected by this one cheap search
+_PREFILTER_RE = (re2 or re).compile(r'(?i)\b(?:IPC|CrPC|IEA|Penal|Procedure|Evidence)\b')
+
 # Law type mappings
 LAW_MAPPING = {
     'IPC': 'IPC_TO_BNS',
@@ -46,6 +69,21 @@ NEW_LAW_NAMES = {
     'IEA': 'BEA'
 }
 
+_NON_DIGIT_RE = re.compile(r'\D')
+
+_SEPARATOR = "=" * 60
+_COMPARISONS_HEADER = (
+    f"\n\n{_SEPARATOR}\n"
+    "⚖️ LAW COMPARISON: Old Codes vs New Codes (Effective July 1, 2024)\n"
+    f"{_SEPARATOR}\n"
+)
+_COMPARISONS_FOOTER = (
+    f"\n{_SEPARATOR}\n"
+    "Note: The information above compares the old criminal codes with the new Bharatiya laws "
+    "that replaced them on July 1, 2024.\n"
+    f"{_SEPARATOR}"
+)
+
 LAW_FULL_NAMES = {
     'IPC': 'Indian Penal Code',
     'CRPC': 'Code of Criminal Procedure',
@@ -71,20 +109,76 @@ class LawComparisonService:
             current_dir = Path(__file__).parent
             mapping_file_path = current_dir / 'law_mapping_data.json'
         
-        self.mapping_data = self._load_mapping_data(mapping_file_path)
+        # Read-only, since the derived listings and comparison table are built once from it
+        self.mapping_data: Mapping = MappingProxyType(self._load_mapping_data(mapping_file_path))
+        
+        # Mapping data is static, so section listings are built and sorted once
+        self.sorted_sections = {
+            law_type: self._build_section_list(law_type) for law_type in LAW_MAPPING
+        }
+        
+        # Comparisons pre-merged with the law names, keyed by (law_type, SECTION),
+        # so a lookup is a single dict probe
+        self._comparisons = MappingProxyType(self._build_comparisons())
     
     def _load_mapping_data(self, file_path: Path) -> Dict:
         """Load law mapping data from JSON file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            # orjson parses the raw UTF-8 bytes, no text-mode decode pass
+            with open(file_path, 'rb') as f:
+                return orjson.loads(f.read())
         except FileNotFoundError:
             print(f"Warning: Mapping file not found at {file_path}")
             return {"IPC_TO_BNS": {}, "CRPC_TO_BNSS": {}, "IEA_TO_BEA": {}}
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             print(f"Error decoding JSON from {file_path}: {e}")
             return {"IPC_TO_BNS": {}, "CRPC_TO_BNSS": {}, "IEA_TO_BEA": {}}
     
+    def _build_comparisons(self) -> Dict[Tuple[str, str], Dict]:
+        """Flatten the per-law mapping data into comparison dicts keyed by (law_type, section)"""
+        comparisons = {}
+        for law_type, mapping_key in LAW_MAPPING.items():
+            new_law = NEW_LAW_NAMES.get(law_type)
+            law_meta = {
+                'old_law': law_type,
+                'old_law_full_name': LAW_FULL_NAMES.get(law_type, law_type),
+                'new_law': new_law,
+                'new_law_full_name': LAW_FULL_NAMES.get(new_law, '')
+            }
+            for section, section_data in self.mapping_data.get(mapping_key, {}).items():
+                if section_data:
+                    comparisons[(law_type, section.upper())] = {**law_meta, **section_data}
+        return comparisons
+    
+    def _build_section_list(self, law_type: str) -> List[Dict]:
+        """Build the section listing for an old law, sorted by section number"""
+        sections_data = self.mapping_data.get(LAW_MAPPING[law_type], {})
+        new_law = NEW_LAW_NAMES.get(law_type, '')
+        
+        keyed = []
+        for section_num, data in sections_data.items():
+            sort_key = (int(_NON_DIGIT_RE.sub('', section_num) or '0'), section_num)
+            keyed.append((sort_key, {
+                "section": section_num,
+                "title": data.get("old_title", ""),
+                "new_section": data.get("new_section", ""),
+                "new_law": new_law
+            }))
+        keyed.sort(key=lambda item: item[0])
+        return [section for _, section in keyed]
+    
+    def get_sections(self, law_type: str) -> List[Dict]:
+        """
+        Get all mapped sections of an old law, sorted by section number
+        
+        Args:
+            law_type: Type of law (IPC, CRPC, IEA)
+            
+        Returns:
+            List of dicts with 'section', 'title', 'new_section' and 'new_law' keys
+        """
+        return self.sorted_sections.get(law_type.upper(), [])
+    
     def detect_law_sections(self, text: str) -> List[Dict[str, str]]:
         """
         Detect all law section references in the given text
@@ -95,25 +189,10 @@ class LawComparisonService:
         Returns:
             List of dicts with 'law_type' and 'section' keys
         """
-        detected_sections = []
-        seen = set()  # To avoid duplicates
-        
-        for law_type, patterns in PATTERNS.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE)
-                for match in matches:
-                    section = match.group(1).upper()
-                    key = f"{law_type}:{section}"
-                    
-                    if key not in seen:
-                        seen.add(key)
-                        detected_sections.append({
-                            'law_type': law_type,
-                            'section': section,
-                            'original_text': match.group(0)
-                        })
-        
-        return detected_sections
+        return [
+            {'law_type': law_type, 'section': section, 'original_text': original_text}
+            for law_type, section, original_text in _scan_law_sections(text)
+        ]
     
     def get_comparison_data(self, law_type: str, section: str) -> Optional[Dict]:
         """
@@ -126,22 +205,9 @@ class LawComparisonService:
         Returns:
             Dictionary with comparison data or None if not found
         """
-        mapping_key = LAW_MAPPING.get(law_type.upper())
-        if not mapping_key:
-            return None
-        
-        section_data = self.mapping_data.get(mapping_key, {}).get(section.upper())
-        if not section_data:
-            return None
-        
-        # Enrich with law names
-        return {
-            'old_law': law_type.upper(),
-            'old_law_full_name': LAW_FULL_NAMES.get(law_type.upper(), law_type.upper()),
-            'new_law': NEW_LAW_NAMES.get(law_type.upper()),
-            'new_law_full_name': LAW_FULL_NAMES.get(NEW_LAW_NAMES.get(law_type.upper(), ''), ''),
-            **section_data
-        }
+        comparison = self._comparisons.get((law_type.upper(), section.upper()))
+        # Callers may annotate the result, so never hand out the shared dict itself
+        return dict(comparison) if comparison else None
     
     def get_all_comparisons(self, detected_sections: List[Dict[str, str]]) -> List[Dict]:
         """
@@ -211,20 +277,14 @@ class LawComparisonService:
         if not comparisons:
             return ""
         
-        header = "\n\n" + "="*60 + "\n"
-        header += "⚖️ LAW COMPARISON: Old Codes vs New Codes (Effective July 1, 2024)\n"
-        header += "="*60 + "\n"
-        
-        formatted = [header]
+        # Constant header/footer, one join over all the pieces
+        parts = [_COMPARISONS_HEADER]
         for i, comp in enumerate(comparisons, 1):
-            formatted.append(f"\n{i}. {self.format_comparison_text(comp)}")
-        
-        footer = "\n" + "="*60 + "\n"
-        footer += "Note: The information above compares the old criminal codes with the new Bharatiya laws that replaced them on July 1, 2024.\n"
-        footer += "="*60
-        
-        formatted.append(footer)
-        return "\n".join(formatted)
+            parts.append(f"\n\n{i}. ")
+            parts.append(self.format_comparison_text(comp))
+        parts.append("\n")
+        parts.append(_COMPARISONS_FOOTER)
+        return "".join(parts)
     
     def augment_answer(self, original_answer: str, question: str = "") -> Tuple[str, List[Dict]]:
         """
@@ -238,7 +298,9 @@ class LawComparisonService:
             Tuple of (augmented_answer, list_of_comparisons)
         """
         # Detect sections in both question and answer
-        all_text = question + " " + original_answer
+        all_text = f"{question} {original_answer}" if question else original_answer
+        if not _PREFILTER_RE.search(all_text):
+            return original_answer, []
         detected = self.detect_law_sections(all_text)
         
         if not detected:
@@ -257,15 +319,49 @@ class LawComparisonService:
         return augmented, comparisons
 
 
+def _text_digest(text: str) -> bytes:
+    # Cache key: an 8-byte digest, so cached entries do not keep whole LLM answers alive
+    return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+
+@cached(LRUCache(maxsize=2048), key=_text_digest, lock=threading.Lock())
+def _scan_law_sections(text: str) -> Tuple[Tuple[str, str, str], ...]:
+    """Find unique (law_type, section, original_text) references, ordered by law then pattern"""
+    detected_sections = []
+    seen = set()  # To avoid duplicates
+    # Bound to locals so the loop does fast local loads instead of attribute/global lookups
+    seen_add, detected_append = seen.add, detected_sections.append
+    
+    for law_type, pattern in _SECTION_PATTERNS:
+        for match in pattern.finditer(text):
+            key = (law_type, match.group(1).upper())
+            
+            if key not in seen:
+                seen_add(key)
+                detected_append((*key, match.group(0)))
+    
+    return tuple(detected_sections)
+
+
 # Convenience functions for direct usage
-_service_instance = None
+_services: Dict[Optional[str], LawComparisonService] = {}
+_service_lock = threading.Lock()
 
-def get_service() -> LawComparisonService:
-    """Get singleton instance of LawComparisonService"""
-    global _service_instance
-    if _service_instance is None:
-        _service_instance = LawComparisonService()
-    return _service_instance
+def get_service(mapping_file_path: Optional[str] = None) -> LawComparisonService:
+    """
+    Get the shared LawComparisonService for a mapping file (safe to call from worker threads)
+    
+    Args:
+        mapping_file_path: Path to the mapping JSON (None = the bundled law_mapping_data.json)
+    """
+    service = _services.get(mapping_file_path)
+    if service is None:
+        # Loaded once per path; concurrent first callers wait rather than parse the JSON twice
+        with _service_lock:
+            service = _services.get(mapping_file_path)
+            if service is None:
+                service = _services[mapping_file_path] = LawComparisonService(mapping_file_path)
+    return service
 
 
 def detect_law_sections(text: str) -> List[Dict[str, str]]:
@@ -3,5 +3,6 @@ NyayAssist Middleware Package
 """
 
 from .logging_middleware import AccessLogMiddleware, get_client_ip
+from .compression_middleware import SelectiveGZipMiddleware
 
-__all__ = ['AccessLogMiddleware', 'get_client_ip']
+__all__ = ['AccessLogMiddleware', 'get_client_ip', 'SelectiveGZipMiddleware']
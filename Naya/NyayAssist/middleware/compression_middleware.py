@@ -0,0 +1,23 @@
+"""
+Response Compression Middleware
+Gzip-compresses API responses, leaving Server-Sent Event streams untouched
+"""
+
+from typing import Iterable
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZip middleware that skips the given paths (e.g. SSE endpoints, which must flush per event)"""
+    
+    def __init__(self, app: ASGIApp, exclude_paths: Iterable[str] = (), **kwargs):
+        super().__init__(app, **kwargs)
+        self.exclude_paths = frozenset(exclude_paths)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -4,14 +4,19 @@ Logs all API requests and responses to MySQL database
 """
 
 import time
-import json
 from typing import Callable
+
+import orjson
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import Message
 
 from database.db_service import db_service
 
+MAX_LOGGED_BODY_BYTES = 4096
+# Uploads are never buffered just to be logged
+BINARY_CONTENT_TYPES = ("multipart/", "application/pdf", "application/octet-stream")
+
 
 class AccessLogMiddleware(BaseHTTPMiddleware):
     """Middleware to log all API access to database"""
@@ -34,17 +39,26 @@ class AccessLogMiddleware(BaseHTTPMiddleware):
         # Try to get request body (for POST requests)
         request_body = None
         if http_method in ["POST", "PUT", "PATCH"]:
-            try:
-                body = await request.body()
-                if body:
-                    request_body = json.loads(body.decode())
-                    # Don't log sensitive fields
-                    if "password" in request_body:
-                        request_body["password"] = "[REDACTED]"
-                    if "password_hash" in request_body:
-                        request_body["password_hash"] = "[REDACTED]"
-            except:
-                pass
+            content_type = request.headers.get("content-type", "")
+            content_length = request.headers.get("content-length", "")
+            if content_type.startswith(BINARY_CONTENT_TYPES):
+                request_body = {"_skipped": "binary"}
+            elif content_length.isdigit() and int(content_length) > MAX_LOGGED_BODY_BYTES:
+                request_body = {"_skipped": "too_large", "size": int(content_length)}
+            else:
+                try:
+                    body = await request.body()
+                    if len(body) > MAX_LOGGED_BODY_BYTES:
+                        request_body = {"_skipped": "too_large", "size": len(body)}
+                    elif body:
+                        request_body = orjson.loads(body)
+                        # Don't log sensitive fields
+                        if "password" in request_body:
+                            request_body["password"] = "[REDACTED]"
+                        if "password_hash" in request_body:
+                            request_body["password_hash"] = "[REDACTED]"
+                except:
+                    pass
         
         # Process request
         response = None
@@ -64,7 +78,7 @@ class AccessLogMiddleware(BaseHTTPMiddleware):
             # Log to database (non-blocking, ignore errors)
             try:
                 # Skip logging for health checks and static files
-                if endpoint not in ["/health", "/", "/docs", "/openapi.json", "/favicon.ico"]:
+                if endpoint not in ["/health", "/health/db", "/", "/docs", "/openapi.json", "/favicon.ico"]:
                     db_service.log_access(
                         endpoint=endpoint,
                         http_method=http_method,
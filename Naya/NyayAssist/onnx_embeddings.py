@@ -0,0 +1,161 @@
+"""
+ONNX Runtime Embeddings
+CPU-optimized sentence-transformer embeddings backed by an INT8-quantized ONNX export
+"""
+
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from numba import njit, prange
+except ImportError:  # Numba is optional, fall back to vectorized NumPy
+    njit = None
+
+DEFAULT_EXPORT_DIR = Path(__file__).parent / "onnx_model"
+MODEL_FILE_NAME = "model.onnx"
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+
+
+def _pool_normalize_numpy(last_hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Mean-pool token embeddings over the attention mask, then L2-normalize"""
+    mask = mask.astype(np.float32)
+    pooled = np.einsum("bsd,bs->bd", last_hidden, mask)
+    pooled /= np.maximum(mask.sum(axis=1, keepdims=True), 1e-9)
+    pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+    return pooled
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _pool_normalize_numba(last_hidden, mask):
+        batch, seq_len, dim = last_hidden.shape
+        out = np.zeros((batch, dim), dtype=np.float32)
+        for i in prange(batch):
+            count = 0.0
+            for t in range(seq_len):
+                if mask[i, t]:
+                    count += 1.0
+                    for d in range(dim):
+                        out[i, d] += last_hidden[i, t, d]
+            norm = 0.0
+            for d in range(dim):
+                out[i, d] /= max(count, 1e-9)
+                norm += out[i, d] * out[i, d]
+            norm = max(np.sqrt(norm), 1e-12)
+            for d in range(dim):
+                out[i, d] /= norm
+        return out
+
+    pool_normalize = _pool_normalize_numba
+else:
+    pool_normalize = _pool_normalize_numpy
+
+
+def export_onnx_model(model_name: str, export_dir: Optional[str] = None, quantize: bool = True) -> Path:
+    """
+    Export a sentence-transformer to ONNX (and dynamic INT8) once, returning the .onnx path
+
+    Args:
+        model_name: Hugging Face model id
+        export_dir: Output directory (defaults to ./onnx_model)
+        quantize: Also produce an AVX-512 VNNI dynamically quantized INT8 model
+    """
+    export_dir = Path(export_dir) if export_dir else DEFAULT_EXPORT_DIR
+    model_path = export_dir / MODEL_FILE_NAME
+    quantized_path = export_dir / QUANTIZED_FILE_NAME
+
+    if not model_path.exists():
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+
+    if not quantize:
+        return model_path
+
+    if not quantized_path.exists():
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        quantizer = ORTQuantizer.from_pretrained(export_dir, file_name=MODEL_FILE_NAME)
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=export_dir, quantization_config=qconfig)
+
+    return quantized_path
+
+
+class ONNXEmbeddings(Embeddings):
+    """LangChain embeddings that run a sentence-transformer through ONNX Runtime"""
+
+    def __init__(self, model_name: str, export_dir: Optional[str] = None,
+                 quantize: bool = True, batch_size: int = 128,
+                 intra_op_num_threads: Optional[int] = None,
+                 inter_op_num_threads: Optional[int] = None):
+        """
+        Load (exporting on first use) the ONNX model for a sentence-transformer
+
+        Args:
+            model_name: Hugging Face model id, e.g. sentence-transformers/all-MiniLM-L6-v2
+            export_dir: Directory holding the exported ONNX files
+            quantize: Use dynamic INT8 quantization (AVX-512 VNNI kernels)
+            batch_size: Number of texts encoded per ONNX Runtime call
+            intra_op_num_threads: ONNX Runtime threads per call (defaults to half the cores;
+                pass 1 when running several API worker processes)
+            inter_op_num_threads: ONNX Runtime threads across graph nodes (defaults to ORT's choice)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.export_dir = Path(export_dir) if export_dir else DEFAULT_EXPORT_DIR
+        self.batch_size = batch_size
+
+        model_path = export_onnx_model(model_name, self.export_dir, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.export_dir)
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session_options.intra_op_num_threads = intra_op_num_threads or max(1, (os.cpu_count() or 2) // 2)
+        if inter_op_num_threads:
+            session_options.inter_op_num_threads = inter_op_num_threads
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        feeds = {name: value.astype(np.int64) for name, value in inputs.items() if name in self._input_names}
+        last_hidden = self.session.run(None, feeds)[0]
+
+        # Mean-pool over real tokens, then L2-normalize for cosine similarity
+        return pool_normalize(np.ascontiguousarray(last_hidden, dtype=np.float32), inputs["attention_mask"])
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of documents into a float32 matrix"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        # Encode in length order so each batch pads to a similar length, then restore order
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        vectors = np.vstack([
+            self._encode(sorted_texts[start:start + self.batch_size])
+            for start in range(0, len(sorted_texts), self.batch_size)
+        ])
+        return vectors[np.argsort(order)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents"""
+        return self.embed_documents_array(texts).tolist() if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query"""
+        return self._encode([text])[0].tolist()
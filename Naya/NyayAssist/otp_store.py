@@ -0,0 +1,95 @@
+"""
+OTP Store
+Expiring storage for email verification codes, shared across workers via Redis when configured
+"""
+
+import hmac
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class OTPStore:
+    """Verification codes keyed by email, backed by Redis or an in-process dict"""
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = 600):
+        """
+        Initialize the store
+
+        Args:
+            redis_url: Redis connection URL (e.g. redis://localhost:6379/0); None keeps codes
+                in this process only, which does not work with more than one worker
+            ttl: Seconds a code stays valid
+        """
+        self.ttl = ttl
+        self._redis = None
+        self._codes: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+        if redis_url:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(redis_url, decode_responses=True)
+
+    @property
+    def backend(self) -> str:
+        return "redis" if self._redis is not None else "memory"
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f"otp:{email.lower()}"
+
+    async def set(self, email: str, code: str):
+        """Store a code for an email, replacing any previous one"""
+        if self._redis is not None:
+            await self._redis.setex(self._key(email), self.ttl, code)
+            return
+        now = time.time()
+        with self._lock:
+            # Drop expired codes so abandoned sign-ups do not accumulate
+            self._codes = {k: v for k, v in self._codes.items() if v[1] > now}
+            self._codes[self._key(email)] = (code, now + self.ttl)
+
+    async def get(self, email: str) -> Optional[str]:
+        """Return the unexpired code for an email, or None"""
+        if self._redis is not None:
+            return await self._redis.get(self._key(email))
+        with self._lock:
+            entry = self._codes.get(self._key(email))
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    async def consume(self, email: str, code: str) -> bool:
+        """
+        Atomically remove the code for an email and check it against a submitted one
+        
+        The stored code is invalidated by any attempt, so a code can be used at most
+        once even by concurrent requests (and cannot be guessed repeatedly).
+        
+        Args:
+            email: Email the code was sent to
+            code: Code submitted by the user
+            
+        Returns:
+            True if an unexpired code was stored and it matches
+        """
+        if self._redis is not None:
+            stored = await self._redis.getdel(self._key(email))
+        else:
+            with self._lock:
+                entry = self._codes.pop(self._key(email), None)
+            stored = entry[0] if entry is not None and entry[1] > time.time() else None
+        return stored is not None and hmac.compare_digest(stored, code)
+    
+    async def delete(self, email: str):
+        """Invalidate the code for an email"""
+        if self._redis is not None:
+            await self._redis.delete(self._key(email))
+            return
+        with self._lock:
+            self._codes.pop(self._key(email), None)
+
+    async def close(self):
+        """Close the Redis connection pool, if any"""
+        if self._redis is not None:
+            await self._redis.aclose()
@@ -0,0 +1,102 @@
+"""
+Semantic Response Cache
+In-memory cache that returns stored responses for semantically similar questions
+"""
+
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """Cache of responses searched by question embedding cosine similarity"""
+
+    def __init__(self, dimension: int = 384, threshold: float = 0.92, candidates: int = 8,
+                 ttl: Optional[float] = None, max_entries: int = 10_000):
+        """
+        Initialize an empty cache
+
+        Args:
+            dimension: Size of the (L2-normalized) question embeddings
+            threshold: Minimum cosine similarity for a cached response to be reused
+            candidates: Nearest neighbours checked when a lookup key must also match
+            ttl: Seconds a cached response stays valid (None = until cleared)
+            max_entries: Entries kept before the cache is flushed
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.candidates = candidates
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = faiss.IndexFlatIP(dimension)
+        self._entries: List[Tuple[Optional[Hashable], str, Any, float]] = []
+        self._version: Optional[Hashable] = None
+
+    @staticmethod
+    def _as_matrix(vector: List[float]) -> np.ndarray:
+        return np.asarray([vector], dtype="float32")
+
+    def _check_version(self, version: Optional[Hashable]):
+        # Entries computed against an older corpus are dropped (lock must be held)
+        if version is not None and version != self._version:
+            self._index.reset()
+            self._entries = []
+            self._version = version
+
+    def lookup(self, vector: List[float], key: Optional[Hashable] = None,
+               version: Optional[Hashable] = None) -> Optional[Any]:
+        """
+        Find a cached response for a question embedding
+
+        Args:
+            vector: Normalized embedding of the incoming question
+            key: Extra value that must match exactly (e.g. a result page number)
+            version: Identifier of the data the responses depend on
+
+        Returns:
+            The cached response if a similar enough question was seen, else None
+        """
+        with self._lock:
+            self._check_version(version)
+            if self._index.ntotal:
+                scores, ids = self._index.search(self._as_matrix(vector), min(self.candidates, self._index.ntotal))
+                for score, idx in zip(scores[0], ids[0]):
+                    if idx < 0 or score < self.threshold:
+                        break
+                    entry_key, _, response, created_at = self._entries[idx]
+                    expired = self.ttl is not None and time.time() - created_at > self.ttl
+                    if entry_key == key and not expired:
+                        self.hits += 1
+                        return response
+            self.misses += 1
+            return None
+
+    def add(self, vector: List[float], question: str, response: Any,
+            key: Optional[Hashable] = None, version: Optional[Hashable] = None):
+        """Store a response for a question embedding"""
+        with self._lock:
+            self._check_version(version)
+            if len(self._entries) >= self.max_entries:
+                self._index.reset()
+                self._entries = []
+            self._index.add(self._as_matrix(vector))
+            self._entries.append((key, question, response, time.time()))
+
+    def clear(self):
+        """Drop all cached entries (e.g. when the underlying documents change)"""
+        with self._lock:
+            self._index.reset()
+            self._entries = []
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of cached entries"""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)